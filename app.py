@@ -7,9 +7,11 @@ import uuid
 import time
 import base64
 import warnings
-from chitchat_module import ChitChatSystem
+from chitchat_module import get_chitchat_system
 from classifier_module import classify_query
-from wiki_qna_module import fetch_relevant_documents
+from wiki_qna_module import retrieve, query_cache, warm_up
+from summary_cache import summary_cache
+from document_stream import DocumentStream
 import sqlite3
 import pandas as pd
 import json
@@ -22,7 +24,7 @@ import matplotlib.pyplot as plt
 warnings.filterwarnings("ignore", message="Tried to instantiate class '__path__._path'")
 
 # Initialize the ChitChat system
-chit_chat_system = ChitChatSystem()
+chit_chat_system = get_chitchat_system()
 MODEL_DIR = Path("model/topic_classifier_model.joblib")
 
 DB_PATH = "chatbot.db"
@@ -49,6 +51,16 @@ def init_db():
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     """)
+
+    # Columns added after the table was first created
+    cursor.execute("PRAGMA table_info(chat_messages)")
+    columns = {row[1] for row in cursor.fetchall()}
+    if "timings" not in columns:
+        cursor.execute("ALTER TABLE chat_messages ADD COLUMN timings TEXT")
+    if "ttft_ms" not in columns:
+        cursor.execute("ALTER TABLE chat_messages ADD COLUMN ttft_ms REAL")
+    if "total_ms" not in columns:
+        cursor.execute("ALTER TABLE chat_messages ADD COLUMN total_ms REAL")
     
     # Feedback table
     cursor.execute("""
@@ -67,13 +79,17 @@ def init_db():
     conn.commit()
     conn.close()
 
-def save_message(session_id, role, message, topic=None, relevance=None, rating=None, query_type=None):
-    """Save a chat message to the database."""
+def save_message(session_id, role, message, topic=None, relevance=None, rating=None, query_type=None, timings=None,
+                 ttft_ms=None, total_ms=None):
+    """
+    Save a chat message to the database, with per-stage timings (ms) for retrieval answers and,
+    for bot responses, the time to the first streamed token and to the full response (ms).
+    """
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     cursor.execute("""
-        INSERT INTO chat_messages (session_id, role, message, topic, relevance, rating, query_type)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO chat_messages (session_id, role, message, topic, relevance, rating, query_type, timings, ttft_ms, total_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         session_id,
         role,
@@ -81,7 +97,10 @@ def save_message(session_id, role, message, topic=None, relevance=None, rating=N
         topic if topic is not None else "General",
         relevance if relevance is not None else None,
         rating if rating is not None else None,
-        query_type if query_type is not None else "Unknown"
+        query_type if query_type is not None else "Unknown",
+        json.dumps(timings) if timings is not None else None,
+        ttft_ms,
+        total_ms
     ))
     
     # Get the last inserted message_id to use in feedback tracking
@@ -159,14 +178,10 @@ def get_messages(session_id):
 def load_resources():
     """Load the required resources."""
     try:
-        with open(DATA_DIR / "inverted_index.json", "r") as idx_file:
-            inverted_index = json.load(idx_file)
-        with open(DATA_DIR / "scraped_data.json", "r") as data_file:
-            scraped_data = json.load(data_file)
-        return inverted_index, scraped_data
+        return DocumentStream(DATA_DIR / "scraped_data.json")
     except Exception as e:
         st.error(f"Error loading resources: {e}")
-        return None, None
+        return None
 
 
 def encode_image(image_path):
@@ -267,6 +282,44 @@ def format_response(relevant_docs, answers):
         response += "No detailed answers found."
     return response
 
+def stream_response(placeholder, chunks, format_text=lambda text: text, refresh=0.05):
+    """
+    Render streamed chunks in the placeholder's chat bubble as they arrive.
+
+    The bubble is redrawn at most every ``refresh`` seconds, and once more at
+    the end. Returns the text and the time its first chunk arrived.
+    """
+    text = ""
+    first_token = None
+    last_render = 0.0
+    for chunk in chunks:
+        now = time.perf_counter()
+        if first_token is None:
+            first_token = now
+        text += chunk
+        if now - last_render >= refresh:
+            with placeholder:
+                render_message("assistant", format_text(text))
+            last_render = now
+    with placeholder:
+        render_message("assistant", format_text(text))
+    return text, first_token
+
+def respond_with_retrieval(session_id, user_input, topics, topic_label, placeholder):
+    """
+    Retrieve, summarise and log the documents for a query once, streaming the summary into the placeholder.
+    Returns the response, the retrieval result and the time the first summary token arrived.
+    """
+    result = retrieve(user_input, topics, stream=True)
+    summary, first_token = stream_response(
+        placeholder, result.summary_stream, lambda text: format_response(text, result.answers)
+    )
+    response = format_response(summary, result.answers)
+    # One row per retrieved document, so each relevance score sits next to the document it was given to.
+    for doc, score in zip(result.documents, result.scores):
+        save_message(session_id, "assistant", f"{doc['title']} ({doc['url']})", topic=topic_label, relevance=score)
+    return response, result, first_token
+
 def chatbot_interface():
     # Initialize the database
     init_db()
@@ -376,57 +429,55 @@ def chatbot_interface():
                 
             else:
             # Bot response generation
+                # The typing animation shows until the first token arrives, which then streams into the same bubble
+                start = time.perf_counter()
                 typing_placeholder = st.empty()
                 with typing_placeholder:
                     render_typing_animation()
                 
-                inverted_index, scraped_data = load_resources()
-                if not inverted_index or not scraped_data:
+                scraped_data = load_resources()
+                result = None
+                first_token = None
+                if not scraped_data:
                     response = "Failed to load resources. Please check your data files."
                 else:
                     try:
                         if st.session_state.selected_option == "Automatic":
+                            # Load the QA system and build its hybrid-search matrix while the query is classified
+                            warm_up(user_input)
                             query_topic = classify_query(user_input, MODEL_DIR)
                             if query_topic == "General":
-                                response = chit_chat_system.generate_chitchat_response(
-                                    user_input=user_input,
-                                    chat_history=[msg[1] for msg in chat_history if msg[0] == "user"]
+                                response, first_token = stream_response(
+                                    typing_placeholder,
+                                    chit_chat_system.stream_chitchat_response(
+                                        user_input=user_input,
+                                        chat_history=[msg[2] for msg in chat_history if msg[1] == "user"],
+                                        session_id=session_id
+                                    )
                                 )
                             else:
-                                relevant_docs, answers, relevance_scores, _ = fetch_relevant_documents(
-                                    user_input, query_topic, inverted_index, scraped_data
-                                )
-                                response = format_response(relevant_docs, answers)
-                                for doc, score in zip(relevant_docs.split("\n\n"), relevance_scores):
-                                    save_message(session_id, "assistant", doc, topic=query_topic, relevance=score)
+                                response, result, first_token = respond_with_retrieval(session_id, user_input, query_topic, query_topic, typing_placeholder)
                         
                         elif st.session_state.selected_option == "Food and Travel":
-                            food_relevant_docs, food_answers, food_relevance_scores, _ = fetch_relevant_documents(
-                                user_input, "Food", inverted_index, scraped_data
-                            )
-                            travel_relevant_docs, travel_answers, travel_relevance_scores, _ = fetch_relevant_documents(
-                                user_input, "Food", inverted_index, scraped_data
-                            )
-                            relevant_docs, answers, relevance_scores = food_relevant_docs and travel_relevant_docs, food_answers and travel_answers, food_relevance_scores and travel_relevance_scores
-                            response = format_response(relevant_docs, answers)
-                            for doc, score in zip(relevant_docs.split("\n\n"), relevance_scores):
-                                save_message(session_id, "assistant", doc, topic=selected_option, relevance=score)
+                            response, result, first_token = respond_with_retrieval(session_id, user_input, ["Food", "Travel"], selected_option, typing_placeholder)
                         
                         else:
-                            relevant_docs, answers, relevance_scores, _ = fetch_relevant_documents(
-                                user_input, st.session_state.selected_option, inverted_index, scraped_data
-                            )
-                            response = format_response(relevant_docs, answers)
-                            for doc, score in zip(relevant_docs.split("\n\n"), relevance_scores):
-                                save_message(session_id, "assistant", doc, topic=selected_option, relevance=score)
+                            response, result, first_token = respond_with_retrieval(session_id, user_input, st.session_state.selected_option, selected_option, typing_placeholder)
 
                     except Exception as e:
                         response = f"An error occurred: {e}"
 
+                end = time.perf_counter()
                 typing_placeholder.empty()
                 
                 # Save assistant message and track its message_id
-                assistant_message_id = save_message(session_id, "assistant", response, topic=selected_option)
+                timings = result.timings_ms() if result is not None else None
+                ttft_ms = round(((first_token or end) - start) * 1000, 3)
+                total_ms = round((end - start) * 1000, 3)
+                assistant_message_id = save_message(
+                    session_id, "assistant", response, topic=selected_option, timings=timings,
+                    ttft_ms=ttft_ms, total_ms=total_ms
+                )
                 render_message("assistant", response, assistant_message_id)  # Render feedback for all other messages
     
 
@@ -446,6 +497,14 @@ def visualize_data():
         st.warning("No data available for visualization.")
         return
 
+    # Query cache statistics for this server process
+    st.subheader("Query Cache")
+    st.table(pd.DataFrame([query_cache.stats()]))
+
+    # Persistent summary cache statistics, since the cache file was created
+    st.subheader("Summary Cache")
+    st.table(pd.DataFrame([summary_cache.stats()]))
+
     # Bar chart: Messages per topic
     if "topic" in messages_df.columns and not messages_df["topic"].isnull().all():
         topic_counts = messages_df['topic'].value_counts()
@@ -502,6 +561,13 @@ def visualize_data():
     else:
         st.warning("No timestamp data available for latency analysis.")
 
+    # Time to first token and total response time of streamed bot responses
+    if "ttft_ms" in messages_df.columns and not messages_df['ttft_ms'].isnull().all():
+        streamed = messages_df[messages_df['ttft_ms'].notnull()]
+        st.subheader("Response Time to First Token and Total (ms)")
+        st.table(streamed[['ttft_ms', 'total_ms']].describe(percentiles=[0.5, 0.95, 0.99]).T)
+        st.line_chart(streamed.set_index('timestamp')[['ttft_ms', 'total_ms']])
+
     # Query Type Distribution
     if "query_type" in messages_df.columns and not messages_df["query_type"].isnull().all():
         query_type_distribution = messages_df['query_type'].value_counts()
@@ -0,0 +1,115 @@
+"""
+Index size, decode throughput and AND-query latency for each postings codec.
+
+Run from the repository root:
+
+    python -m benchmarks.codec_benchmark
+"""
+import os
+import csv
+import random
+import time
+import tempfile
+from pathlib import Path
+from itertools import islice
+from preprocess_index import Preprocessor, Indexer
+from binary_index import BinaryIndexReader, write_indexer, POSTINGS_SUFFIX
+from postings_codec import CODECS
+from query_engine import BooleanQueryEngine
+from document_stream import iter_documents
+
+DATA_DIR = Path("data")
+
+
+def load_documents(limit=20000):
+    """
+    (doc_id, text) pairs from the scraped corpus if it is available.
+
+    Otherwise the general questions dataset stands in, with random ids in the
+    range of Wikipedia revision ids so the gaps are realistically sized.
+    """
+    scraped = DATA_DIR / "scraped_data.json"
+    if scraped.exists():
+        documents = [(doc['revision_id'], f"{doc['title']} {doc['summary']}") for _, doc in islice(iter_documents(scraped), limit)]
+    else:
+        rng = random.Random(0)
+        with open(DATA_DIR / "general_questions_dataset.csv", 'r', newline='') as file:
+            documents = [(rng.randrange(10**9, 2 * 10**9), f"{row['question']} {row['answer']}") for row in csv.DictReader(file)]
+    return documents[:limit]
+
+
+def build_indexer(documents):
+    preprocessor = Preprocessor()
+    indexer = Indexer()
+    for doc_id, tokens in zip((doc_id for doc_id, _ in documents), preprocessor.tokenize_batch(text for _, text in documents)):
+        indexer.generate_inverted_index(doc_id, tokens)
+    indexer.sort_terms()
+    indexer.add_skip_connections()
+    indexer.calculate_tf_idf()
+    return indexer
+
+
+def sample_queries(indexer, n_queries=500, seed=0):
+    """Two- and three-term AND queries over the more frequent terms, where intersections do real work."""
+    rng = random.Random(seed)
+    terms = sorted(indexer.get_index(), key=lambda term: -indexer.get_postings(term).length)[:500]
+    return [rng.sample(terms, rng.choice((2, 3))) for _ in range(n_queries)]
+
+
+def run(documents, repeat=3):
+    indexer = build_indexer(documents)
+    queries = sample_queries(indexer)
+    n_postings = sum(postings.length for postings in indexer.get_index().values())
+
+    results = {}
+    expected = None
+    with tempfile.TemporaryDirectory() as directory:
+        for codec in CODECS:
+            prefix = os.path.join(directory, codec)
+            write_indexer(indexer, prefix, codec=codec)
+            with BinaryIndexReader(prefix) as reader:
+                terms = list(reader.terms())
+
+                best_decode = float('inf')
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    for term in terms:
+                        reader.get_postings(term)
+                    best_decode = min(best_decode, time.perf_counter() - start)
+
+                engine = BooleanQueryEngine(reader)
+                intersect = engine.intersect_blocks if codec != 'raw' else lambda tokens: engine.intersect(tokens).traverse_list()
+                answers = [intersect(query) for query in queries]
+                if expected is None:
+                    expected = answers
+                elif answers != expected:
+                    raise AssertionError(f"AND results with the {codec} codec differ from the raw codec")
+
+                best_query = float('inf')
+                for _ in range(repeat):
+                    engine.stats.reset()
+                    start = time.perf_counter()
+                    for query in queries:
+                        intersect(query)
+                    best_query = min(best_query, time.perf_counter() - start)
+
+                results[codec] = {
+                    "postings_bytes": os.path.getsize(prefix + POSTINGS_SUFFIX),
+                    "decode_postings_per_sec": n_postings / best_decode,
+                    "and_query_ms": best_query / len(queries) * 1000,
+                    "blocks_decoded_per_query": engine.stats.blocks_decoded / len(queries),
+                }
+    return n_postings, len(queries), results
+
+
+if __name__ == "__main__":
+    documents = load_documents()
+    n_postings, n_queries, results = run(documents)
+    print(f"{len(documents)} documents, {n_postings} postings, {n_queries} AND queries, results identical")
+    for codec, result in results.items():
+        print(
+            f"{codec:>8}: {result['postings_bytes']:>10,} bytes  "
+            f"{result['decode_postings_per_sec']:12,.0f} postings/sec decoded  "
+            f"{result['and_query_ms']:7.3f} ms/AND query  "
+            f"{result['blocks_decoded_per_query']:6.1f} blocks/query"
+        )
@@ -0,0 +1,100 @@
+"""
+Recall@10 and latency of the IVF dense index against exact dense search.
+
+Run from the repository root:
+
+    python -m benchmarks.dense_benchmark
+"""
+import csv
+import time
+import random
+import numpy as np
+from pathlib import Path
+from itertools import islice
+from sklearn.feature_extraction.text import TfidfVectorizer
+from dense_index import DenseIndex
+from document_stream import iter_documents
+
+DATA_DIR = Path("data")
+
+
+def unique_texts(pairs):
+    """(query, text) pairs with the first occurrence of each text only."""
+    seen = set()
+    for query, text in pairs:
+        if text not in seen:
+            seen.add(text)
+            yield query, text
+
+
+def load_corpus(limit=50000, n_queries=500, seed=0):
+    """
+    Document texts and query texts.
+
+    Scraped summaries are searched with article titles as queries if the corpus
+    is available; otherwise the general questions dataset's question and answer
+    pairs are searched with its questions. Duplicate documents are dropped.
+    """
+    scraped = DATA_DIR / "scraped_data.json"
+    if scraped.exists():
+        pairs = ((doc['title'], doc['summary']) for _, doc in iter_documents(scraped) if doc.get('summary'))
+        pairs = list(islice(unique_texts(pairs), limit))
+    else:
+        with open(DATA_DIR / "general_questions_dataset.csv", 'r', newline='') as file:
+            pairs = ((row['question'], f"{row['question']} {row['answer']}") for row in csv.DictReader(file))
+            pairs = list(islice(unique_texts(pairs), limit))
+    queries = [query for query, _ in random.Random(seed).sample(pairs, min(n_queries, len(pairs)))]
+    return [text for _, text in pairs], queries
+
+
+def recall(approximate, exact):
+    """
+    Fraction of the exact top-k that the approximate search found.
+
+    A result counts when it scores at least the exact k-th score, so documents
+    tied with the cut-off are interchangeable.
+    """
+    hits = total = 0
+    for (_, a_scores), (_, e_scores) in zip(approximate, exact):
+        if len(e_scores):
+            hits += min(int(np.sum(a_scores >= e_scores[-1] - 1e-6)), len(e_scores))
+            total += len(e_scores)
+    return hits / total if total else 1.0
+
+
+def timed_search(index, query_vectors, k, nprobe):
+    start = time.perf_counter()
+    results = index.search(query_vectors, k, nprobe)
+    return results, (time.perf_counter() - start) / query_vectors.shape[0]
+
+
+def run(documents, queries, k=10, n_components=128, n_lists=None, nprobes=(1, 2, 4, 8, 16, 32)):
+    vectorizer = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = vectorizer.fit_transform(documents)
+    query_vectors = vectorizer.transform(queries)
+
+    start = time.perf_counter()
+    index = DenseIndex.build(tfidf_matrix, n_components=n_components, n_lists=n_lists)
+    build_time = time.perf_counter() - start
+
+    exact, exact_latency = timed_search(index, query_vectors, k, index.n_lists)
+    results = {}
+    for nprobe in nprobes:
+        if nprobe >= index.n_lists:
+            break
+        approximate, latency = timed_search(index, query_vectors, k, nprobe)
+        results[nprobe] = {"recall": recall(approximate, exact), "ms_per_query": latency * 1000}
+    results[index.n_lists] = {"recall": 1.0, "ms_per_query": exact_latency * 1000}
+    return index, build_time, results
+
+
+if __name__ == "__main__":
+    documents, queries = load_corpus()
+    index, build_time, results = run(documents, queries)
+    print(
+        f"{len(documents)} documents, {len(queries)} queries, {index.dimensions} dimensions, "
+        f"{index.n_lists} lists, built in {build_time:.1f}s"
+    )
+    for nprobe, result in results.items():
+        label = "exact" if nprobe == index.n_lists else f"nprobe={nprobe}"
+        print(f"{label:>11}: recall@10 {result['recall']:.3f}  {result['ms_per_query']:7.3f} ms/query")
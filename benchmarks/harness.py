@@ -0,0 +1,398 @@
+"""
+End-to-end performance harness on synthetic corpora.
+
+Generates corpora shaped like scraped_data.json at the requested sizes,
+replays a query set against each and reports throughput, p50/p95/p99 latency
+and peak RSS for:
+
+    tokenizer   Preprocessor.tokenizer over the document texts
+    indexer     InvertedIndexer build (Preprocessor + Indexer + binary write)
+    qa          QASystem build, artifact reload, search per retrieval mode,
+                and the retrieve pipeline with the LLM call stubbed out
+    classifier  Classifier.classify over the query set
+
+Every benchmark runs in a fresh process, so peak RSS is its own. Results are
+written as JSON, and a previous results file can be passed to --compare to
+see what changed between commits. Nothing touches the network.
+
+Run from the repository root:
+
+    python -m benchmarks.harness --sizes 1000 10000 --output bench.json
+    python -m benchmarks.harness --sizes 1000 10000 --compare bench.json
+"""
+import io
+import os
+import re
+import csv
+import sys
+import json
+import time
+import queue
+import platform
+import resource
+import argparse
+import contextlib
+import subprocess
+import multiprocessing
+import numpy as np
+from pathlib import Path
+
+DATA_DIR = Path("data")
+BENCHMARKS = ('tokenizer', 'indexer', 'qa', 'classifier')
+TOPICS = (
+    "Economy", "Education", "Entertainment", "Environment", "Food",
+    "Health", "Politics", "Sports", "Technology", "Travel",
+)
+
+
+# Synthetic corpora
+
+def load_vocabulary(size=20000):
+    """Real English words, so stemming and stopwords behave as on scraped text."""
+    words = {}
+    questions = DATA_DIR / "general_questions_dataset.csv"
+    if questions.exists():
+        with open(questions, 'r', newline='') as file:
+            for row in csv.DictReader(file):
+                for word in re.findall(r"[a-z]+", f"{row['question']} {row['answer']}".lower()):
+                    words[word] = words.get(word, 0) + 1
+    vocabulary = sorted(words, key=words.get, reverse=True)[:size]
+    # Pad with made-up words so the vocabulary always has the requested size.
+    vocabulary += [f"term{i}" for i in range(size - len(vocabulary))]
+    return vocabulary
+
+
+def generate_corpus(path, n_docs, seed=0, words_per_doc=(60, 200), topic_share=0.2):
+    """
+    Write ``n_docs`` documents grouped by topic, like scraped_data.json, one document at a time.
+
+    Words follow a Zipf distribution over the vocabulary. Each topic also has
+    its own slice of the vocabulary that makes up ``topic_share`` of its
+    documents' words, so topic partitions differ from one another.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(load_vocabulary())
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    topic_vocabulary = np.array_split(rng.permutation(vocabulary), len(TOPICS))
+
+    revision_id = 1_000_000_000
+    with open(path, 'w') as file:
+        file.write("{")
+        for t, topic in enumerate(TOPICS):
+            n_topic = n_docs // len(TOPICS) + (t < n_docs % len(TOPICS))
+            file.write(("," if t else "") + f"\n{json.dumps(topic)}: [")
+            for i in range(n_topic):
+                length = int(rng.integers(*words_per_doc))
+                n_topic_words = int(length * topic_share)
+                words = np.concatenate([
+                    rng.choice(vocabulary, length - n_topic_words, p=weights),
+                    rng.choice(topic_vocabulary[t], n_topic_words),
+                ])
+                rng.shuffle(words)
+                revision_id += int(rng.integers(1, 5000))
+                title = " ".join(words[:3]).title()
+                doc = {
+                    "title": title,
+                    "revision_id": revision_id,
+                    "summary": " ".join(words),
+                    "url": f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}",
+                    "topic": topic,
+                }
+                file.write(("," if i else "") + "\n" + json.dumps(doc))
+            file.write("\n]")
+        file.write("\n}\n")
+
+
+def generate_queries(corpus_path, n_queries, seed=0):
+    """
+    (query, topic) pairs made of a few words drawn from sampled documents.
+
+    Documents are reservoir-sampled while the corpus streams past, so only
+    ``n_queries`` summaries are held at a time.
+    """
+    from document_stream import iter_documents
+
+    rng = np.random.default_rng(seed)
+    sample = []
+    for i, (topic, doc) in enumerate(iter_documents(corpus_path)):
+        if len(sample) < n_queries:
+            sample.append((topic, doc['summary']))
+        else:
+            j = int(rng.integers(0, i + 1))
+            if j < n_queries:
+                sample[j] = (topic, doc['summary'])
+    queries = []
+    for pick in rng.permutation(len(sample)):
+        topic, summary = sample[pick]
+        words = summary.split()
+        start = int(rng.integers(0, max(1, len(words) - 6)))
+        queries.append((" ".join(words[start:start + int(rng.integers(2, 7))]), topic))
+    return queries
+
+
+# Measurements
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def latency_summary(durations):
+    durations = np.asarray(durations) * 1000
+    return {
+        "count": len(durations),
+        "mean_ms": float(durations.mean()) if len(durations) else 0.0,
+        "p50_ms": float(np.percentile(durations, 50)) if len(durations) else 0.0,
+        "p95_ms": float(np.percentile(durations, 95)) if len(durations) else 0.0,
+        "p99_ms": float(np.percentile(durations, 99)) if len(durations) else 0.0,
+    }
+
+
+def time_each(function, items):
+    durations = []
+    for item in items:
+        start = time.perf_counter()
+        function(item)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def stub_llm(prompts):
+    """Stands in for generate_summary_with_gemini: returns the first line of the prompt."""
+    return prompts[0].split("\n", 1)[0]
+
+
+# Benchmarks, each run in its own process
+
+def bench_tokenizer(corpus_path, queries, work_dir, options):
+    from document_stream import iter_documents
+    from preprocess_index import Preprocessor
+
+    preprocessor = Preprocessor()
+    texts = [f"{doc['title']} {doc['summary']}" for _, doc in iter_documents(corpus_path)]
+    durations = time_each(preprocessor.tokenizer, texts)
+    n_tokens = sum(len(preprocessor.tokenizer(text)) for text in texts[:1000])
+    return {
+        "throughput": len(texts) / sum(durations),
+        "throughput_unit": "docs/s",
+        "tokens_per_doc": n_tokens / min(len(texts), 1000),
+        "latency": latency_summary(durations),
+    }
+
+
+def bench_indexer(corpus_path, queries, work_dir, options):
+    from inverted_index_maker import InvertedIndexer
+
+    prefix = os.path.join(work_dir, "inverted_index")
+    indexer = InvertedIndexer(corpus_path, prefix, workers=options['workers'])
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        indexer.process_and_index()
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput": indexer.indexer.doc_count / elapsed,
+        "throughput_unit": "docs/s",
+        "build_s": elapsed,
+        "terms": len(indexer.indexer.get_index()),
+        "index_bytes": sum(os.path.getsize(os.path.join(work_dir, name))
+                           for name in os.listdir(work_dir) if name.startswith("inverted_index.")),
+    }
+
+
+def bench_qa(corpus_path, queries, work_dir, options):
+    import wiki_qna_module
+    from wiki_qna_module import QASystem, summary_prompt
+
+    artifact = os.path.join(work_dir, "qa_system.joblib")
+    for suffix in ("", wiki_qna_module.SUMMARIES_SUFFIX, wiki_qna_module.VECTORS_SUFFIX):
+        if os.path.exists(artifact + suffix):
+            os.remove(artifact + suffix)
+
+    start = time.perf_counter()
+    qa_system = QASystem(corpus_path, artifact, dense=options['dense'])
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    qa_system = QASystem(corpus_path, artifact, dense=options['dense'])
+    load_s = time.perf_counter() - start
+
+    result = {"build_s": build_s, "artifact_load_s": load_s, "search": {}}
+    modes = ('tfidf', 'hybrid', 'dense') if options['dense'] else ('tfidf', 'hybrid')
+    for mode in modes:
+        for scope in ("all", "topic"):
+            durations = time_each(
+                lambda q: qa_system.search_query(q[0], q[1] if scope == "topic" else None, mode=mode), queries
+            )
+            result["search"][f"{mode}/{scope}"] = dict(
+                latency_summary(durations), throughput=len(durations) / sum(durations), throughput_unit="queries/s"
+            )
+
+    start = time.perf_counter()
+    qa_system.search_batch([q for q, _ in queries])
+    batch_s = time.perf_counter() - start
+    result["search_batch"] = {"throughput": len(queries) / batch_s, "throughput_unit": "queries/s"}
+
+    def pipeline(query):
+        retrieval = qa_system.retrieve(query[0], query[1], wiki_qna_module.FALLBACK_THRESHOLD, mode='hybrid')
+        retrieval.summary = stub_llm([summary_prompt(query[0], retrieval.answers)])
+
+    durations = time_each(pipeline, queries)
+    result["retrieve"] = dict(latency_summary(durations), throughput=len(durations) / sum(durations),
+                              throughput_unit="queries/s")
+    result["throughput"] = result["retrieve"]["throughput"]
+    result["throughput_unit"] = "queries/s"
+    result["latency"] = {key: result["retrieve"][key] for key in ("count", "mean_ms", "p50_ms", "p95_ms", "p99_ms")}
+    return result
+
+
+def bench_classifier(corpus_path, queries, work_dir, options):
+    from classifier_module import Classifier
+
+    classifier = Classifier()
+    with contextlib.redirect_stdout(io.StringIO()):
+        durations = time_each(classifier.classify, [q for q, _ in queries])
+    return {
+        "throughput": len(durations) / sum(durations),
+        "throughput_unit": "queries/s",
+        "latency": latency_summary(durations),
+    }
+
+
+def _run_child(name, corpus_path, queries, work_dir, options, results):
+    try:
+        result = globals()[f"bench_{name}"](corpus_path, queries, work_dir, options)
+        result["status"] = "ok"
+    except Exception as e:
+        result = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    result["peak_rss_mb"] = peak_rss_mb()
+    results.put(result)
+
+
+def run_benchmark(name, corpus_path, queries, work_dir, options, poll_interval=1.0):
+    """
+    Run one benchmark in a fresh process and return its result.
+
+    A child that dies without reporting, e.g. killed for running out of
+    memory, is reported as an error instead of leaving the harness waiting.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_child, args=(name, corpus_path, queries, work_dir, options, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=poll_interval)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # The child may have exited right after sending its result.
+        try:
+            result = results.get(timeout=poll_interval)
+        except queue.Empty:
+            result = {"status": "error", "error": f"benchmark process exited with code {process.exitcode} without a result"}
+        break
+    process.join()
+    return result
+
+
+# Reporting
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(args):
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sizes": args.sizes,
+        "queries": args.queries,
+        "seed": args.seed,
+    }
+
+
+def print_result(name, n_docs, result):
+    if result["status"] != "ok":
+        print(f"{name:>10} {n_docs:>9,}  {result['status']}: {result.get('error', '')}")
+        return
+    latency = result.get("latency")
+    latency_text = (
+        f"p50 {latency['p50_ms']:8.3f}  p95 {latency['p95_ms']:8.3f}  p99 {latency['p99_ms']:8.3f} ms"
+        if latency else " " * 48
+    )
+    print(
+        f"{name:>10} {n_docs:>9,}  {result['throughput']:12,.1f} {result['throughput_unit']:<10} "
+        f"{latency_text}  peak RSS {result['peak_rss_mb']:8.1f} MB"
+    )
+    for key, search in result.get("search", {}).items():
+        print(f"{'':>21}{key:<16} p50 {search['p50_ms']:8.3f}  p95 {search['p95_ms']:8.3f}  p99 {search['p99_ms']:8.3f} ms")
+
+
+def compare(results, baseline):
+    """Print throughput and p95 changes against a previous results file."""
+    previous = {(r["benchmark"], r["docs"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for result in results:
+        before = previous.get((result["benchmark"], result["docs"]))
+        if not before or result["status"] != "ok" or before["status"] != "ok":
+            continue
+        change = result["throughput"] / before["throughput"] - 1
+        line = f"{result['benchmark']:>10} {result['docs']:>9,}  throughput {change:+7.1%}"
+        if "latency" in result and "latency" in before:
+            line += f"  p95 {result['latency']['p95_ms'] / before['latency']['p95_ms'] - 1:+7.1%}"
+        line += f"  peak RSS {result['peak_rss_mb'] - before['peak_rss_mb']:+8.1f} MB"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="corpus sizes in documents")
+    parser.add_argument("--queries", type=int, default=500, help="queries replayed per corpus")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--workers", type=int, default=1, help="processes for the index build")
+    parser.add_argument("--dense", action="store_true", help="also build and search the dense index")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default="benchmarks/work", help="where corpora and indexes are written")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="previous results JSON file to compare against")
+    args = parser.parse_args(argv)
+
+    options = {"workers": args.workers, "dense": args.dense}
+    results = []
+    for n_docs in args.sizes:
+        work_dir = os.path.join(args.work_dir, f"{n_docs}")
+        os.makedirs(work_dir, exist_ok=True)
+        corpus_path = os.path.join(work_dir, "scraped_data.json")
+        if not os.path.exists(corpus_path):
+            print(f"Generating {n_docs:,} documents in {corpus_path}...")
+            generate_corpus(corpus_path, n_docs, args.seed)
+        queries = generate_queries(corpus_path, args.queries, args.seed)
+
+        for name in args.benchmarks:
+            result = run_benchmark(name, corpus_path, queries, work_dir, options)
+            result.update(benchmark=name, docs=n_docs)
+            results.append(result)
+            print_result(name, n_docs, result)
+
+    report = {"meta": metadata(args), "results": results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Tokens/sec of Preprocessor.tokenizer against the original two-pass implementation.
+
+Run from the repository root:
+
+    python -m benchmarks.tokenizer_benchmark
+"""
+import re
+import csv
+import time
+from pathlib import Path
+from itertools import islice
+from document_stream import iter_documents
+from preprocess_index import Preprocessor
+
+DATA_DIR = Path("data")
+
+
+def legacy_tokenizer(preprocessor, text):
+    """The tokenizer as it was before precompiled patterns and the stem cache."""
+    text = text.lower()
+    text = re.sub(r"[^A-Za-z0-9]+", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return [preprocessor.ps.stem(word) for word in text.split() if word not in preprocessor.stop_words]
+
+
+def load_texts(limit=20000):
+    """Scraped summaries if they are available, otherwise the general questions dataset."""
+    scraped = DATA_DIR / "scraped_data.json"
+    if scraped.exists():
+        texts = [f"{doc['title']} {doc['summary']}" for _, doc in islice(iter_documents(scraped), limit)]
+    else:
+        with open(DATA_DIR / "general_questions_dataset.csv", 'r', newline='') as file:
+            texts = [f"{row['question']} {row['answer']}" for row in csv.DictReader(file)]
+    return texts[:limit]
+
+
+def run(texts, repeat=3):
+    preprocessor = Preprocessor()
+
+    expected = [legacy_tokenizer(preprocessor, text) for text in texts]
+    if list(preprocessor.tokenize_batch(texts)) != expected:
+        raise AssertionError("Preprocessor.tokenizer output differs from the legacy tokenizer")
+    n_tokens = sum(len(tokens) for tokens in expected)
+
+    results = {}
+    for name, tokenize_all in (
+        ("legacy", lambda: [legacy_tokenizer(preprocessor, text) for text in texts]),
+        ("tokenizer", lambda: [preprocessor.tokenizer(text) for text in texts]),
+        ("tokenize_batch", lambda: list(preprocessor.tokenize_batch(texts))),
+    ):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tokenize_all()
+            best = min(best, time.perf_counter() - start)
+        results[name] = n_tokens / best
+
+    return n_tokens, results, preprocessor.stem_cache_info()
+
+
+if __name__ == "__main__":
+    texts = load_texts()
+    n_tokens, results, cache_info = run(texts)
+    print(f"{len(texts)} texts, {n_tokens} tokens, outputs identical")
+    for name, tokens_per_sec in results.items():
+        speedup = tokens_per_sec / results["legacy"]
+        print(f"{name:>15}: {tokens_per_sec:12,.0f} tokens/sec  ({speedup:.2f}x)")
+    print(f"Stem cache: {cache_info}")
@@ -0,0 +1,339 @@
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import Counter
+from preprocess_index import PostingsList
+from postings_codec import CODECS, BLOCK_SIZE, BlockCursor, encode_doc_ids, decode_doc_ids, encoded_size
+
+# Binary Inverted Index Code
+#
+# An index written with the prefix "data/inverted_index" is three files:
+#
+#   inverted_index.lex   header | fixed-size entries sorted by term | term bytes
+#   inverted_index.post  per term: doc ids in the index's codec, df uint32 tfs, df float64
+#                        scores and, for positional indexes, df uint32 byte lengths followed
+#                        by each posting's encoded position list
+#   inverted_index.docs  doc_count int64 doc ids (sorted) | doc_count uint32 lengths
+#
+# Each lexicon entry records where the term's bytes are and the (offset, length, df)
+# of its postings. All three files are memory-mapped, terms are found by binary search
+# over the entries and postings are only decoded when a term is looked up, so
+# opening an index costs the same no matter how large it is.
+#
+# Doc ids are written with one of the codecs in postings_codec.py: plain int64,
+# or delta + variable-byte / bit-packed blocks behind a per-term skip table.
+
+LEXICON_MAGIC = b'WIXL'
+LEXICON_VERSION = 4
+LEXICON_HEADER = struct.Struct('<4sIQQQII')  # magic, version, n_terms, doc_count, total doc length, flags, codec
+LEXICON_ENTRY = struct.Struct('<QIQQI')    # term offset, term length, postings offset, postings length, df
+
+LEXICON_SUFFIX = '.lex'
+POSTINGS_SUFFIX = '.post'
+DOCS_SUFFIX = '.docs'
+
+FLAG_POSITIONAL = 1
+
+
+def _to_bytes(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+class BinaryIndexWriter:
+    """Stream terms, in sorted order, into the lexicon, postings and docs files."""
+
+    def __init__(self, prefix, doc_lengths, positional=False, codec='vbyte'):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown postings codec {codec!r}, expected one of {CODECS}")
+        self.prefix = str(prefix)
+        self.doc_lengths = doc_lengths
+        self.positional = positional
+        self.codec = codec
+        self._postings_file = open(self.prefix + POSTINGS_SUFFIX, 'wb')
+        self._entries = []
+        self._term_blob = bytearray()
+        self._offset = 0
+        self._last_term = None
+
+    def add_term(self, term, doc_ids, tfs, scores, positions=None):
+        if self._last_term is not None and term <= self._last_term:
+            raise ValueError(f"Terms must be added in sorted order: {term!r} after {self._last_term!r}")
+        if not len(doc_ids) == len(tfs) == len(scores):
+            raise ValueError(f"Postings for {term!r} have {len(doc_ids)} doc ids, {len(tfs)} tfs and {len(scores)} scores")
+        if self.positional and (positions is None or len(positions) != len(doc_ids)):
+            raise ValueError(f"Postings for {term!r} need one position list per doc id in a positional index")
+
+        data = encode_doc_ids(doc_ids, self.codec) + _to_bytes(array('I', tfs)) + _to_bytes(array('d', scores))
+        if self.positional:
+            data += _to_bytes(array('I', [len(p) for p in positions])) + b''.join(positions)
+        self._postings_file.write(data)
+
+        term_bytes = term.encode('utf-8')
+        self._entries.append((len(self._term_blob), len(term_bytes), self._offset, len(data), len(doc_ids)))
+        self._term_blob += term_bytes
+        self._offset += len(data)
+        self._last_term = term
+
+    def close(self):
+        self._postings_file.close()
+
+        doc_ids = sorted(self.doc_lengths)
+        with open(self.prefix + DOCS_SUFFIX, 'wb') as file:
+            file.write(_to_bytes(array('q', doc_ids)))
+            file.write(_to_bytes(array('I', [self.doc_lengths[doc_id] for doc_id in doc_ids])))
+
+        with open(self.prefix + LEXICON_SUFFIX, 'wb') as file:
+            flags = FLAG_POSITIONAL if self.positional else 0
+            header = (
+                LEXICON_MAGIC, LEXICON_VERSION, len(self._entries), len(doc_ids),
+                sum(self.doc_lengths.values()), flags, CODECS.index(self.codec),
+            )
+            file.write(LEXICON_HEADER.pack(*header))
+            for entry in self._entries:
+                file.write(LEXICON_ENTRY.pack(*entry))
+            file.write(self._term_blob)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class BinaryIndexReader:
+    """
+    Read-only, memory-mapped view of a binary inverted index.
+
+    Behaves like the ``{term: [doc_id, ...]}`` dict the JSON index used to be
+    loaded into, while only touching the pages of the terms that are queried.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = str(prefix)
+        self._lexicon_file = open(self.prefix + LEXICON_SUFFIX, 'rb')
+        self._lexicon = mmap.mmap(self._lexicon_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = LEXICON_HEADER.unpack_from(self._lexicon, 0)
+        magic, version, self.n_terms, self.doc_count, self.total_doc_length, flags, codec = header
+        if magic != LEXICON_MAGIC:
+            raise ValueError(f"{self.prefix + LEXICON_SUFFIX} is not a binary inverted index")
+        if version != LEXICON_VERSION:
+            raise ValueError(f"Unsupported binary index version {version}")
+        self.positional = bool(flags & FLAG_POSITIONAL)
+        self.codec = CODECS[codec]
+        self._blob_start = LEXICON_HEADER.size + self.n_terms * LEXICON_ENTRY.size
+
+        self._postings_file = open(self.prefix + POSTINGS_SUFFIX, 'rb')
+        self._postings = self._map(self._postings_file)
+        self._docs_file = open(self.prefix + DOCS_SUFFIX, 'rb')
+        self._docs = self._map(self._docs_file)
+
+    @staticmethod
+    def _map(file):
+        # mmap refuses empty files, which is what an index without terms or documents has.
+        if os.fstat(file.fileno()).st_size:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return b''
+
+    def _entry(self, i):
+        return LEXICON_ENTRY.unpack_from(self._lexicon, LEXICON_HEADER.size + i * LEXICON_ENTRY.size)
+
+    def _term_bytes(self, entry):
+        start = self._blob_start + entry[0]
+        return self._lexicon[start:start + entry[1]]
+
+    def _find(self, term):
+        key = term.encode('utf-8')
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            mid_key = self._term_bytes(entry)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def lookup(self, term):
+        """Return ``(offset, length, df)`` for a term, or None if it is not indexed."""
+        entry = self._find(term)
+        if entry is None:
+            return None
+        return entry[2], entry[3], entry[4]
+
+    def df(self, term):
+        entry = self._find(term)
+        return entry[4] if entry else 0
+
+    def get_postings(self, term):
+        """Decode a term's postings into a ``PostingsList``, empty if the term is not indexed."""
+        postings = PostingsList()
+        entry = self._find(term)
+        if entry is None:
+            return postings
+        offset, df = entry[2], entry[4]
+        tfs_offset = offset + encoded_size(self._postings, offset, df, self.codec)
+        scores_offset = tfs_offset + 4 * df
+        postings.doc_ids = array('q', decode_doc_ids(self._postings, offset, df, self.codec))
+        postings.tfs = _from_bytes('I', self._postings[tfs_offset:scores_offset])
+        postings.scores = _from_bytes('d', self._postings[scores_offset:scores_offset + 8 * df])
+        if self.positional:
+            lengths_offset = scores_offset + 8 * df
+            start = lengths_offset + 4 * df
+            postings.positions = []
+            for length in _from_bytes('I', self._postings[lengths_offset:start]):
+                postings.positions.append(self._postings[start:start + length])
+                start += length
+        postings.length = df
+        if self.codec == 'raw':
+            postings.add_skip_connections()
+        elif df > BLOCK_SIZE:
+            # Line the skip pointers up with the compressed blocks.
+            postings.skip_length = BLOCK_SIZE
+            postings.n_skips = (df - 1) // BLOCK_SIZE
+        return postings
+
+    def block_cursor(self, term):
+        """
+        ``BlockCursor`` over a term's compressed doc ids, decoding blocks only as they are reached.
+
+        Returns None for terms that are not indexed.
+        """
+        if self.codec == 'raw':
+            raise ValueError("Block cursors need an index written with a compressed codec")
+        entry = self._find(term)
+        if entry is None:
+            return None
+        return BlockCursor(self._postings, entry[2], entry[4], self.codec)
+
+    def _doc_position(self, doc_id):
+        lo, hi = 0, self.doc_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_id = struct.unpack_from('<q', self._docs, 8 * mid)[0]
+            if mid_id < doc_id:
+                lo = mid + 1
+            elif mid_id > doc_id:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def has_doc(self, doc_id):
+        return self._doc_position(doc_id) != -1
+
+    def doc_length(self, doc_id):
+        i = self._doc_position(doc_id)
+        if i == -1:
+            return 0
+        return struct.unpack_from('<I', self._docs, 8 * self.doc_count + 4 * i)[0]
+
+    def doc_lengths(self):
+        """Yield ``(doc_id, length)`` for every indexed document, in doc id order."""
+        for i in range(self.doc_count):
+            doc_id = struct.unpack_from('<q', self._docs, 8 * i)[0]
+            yield doc_id, struct.unpack_from('<I', self._docs, 8 * self.doc_count + 4 * i)[0]
+
+    @property
+    def avg_doc_length(self):
+        return self.total_doc_length / self.doc_count if self.doc_count else 0.0
+
+    def terms(self):
+        for i in range(self.n_terms):
+            yield self._term_bytes(self._entry(i)).decode('utf-8')
+
+    def get(self, term, default=None):
+        if self._find(term) is None:
+            return default
+        return self[term]
+
+    def __getitem__(self, term):
+        if self._find(term) is None:
+            raise KeyError(term)
+        return self.get_postings(term).traverse_list()
+
+    def __contains__(self, term):
+        return self._find(term) is not None
+
+    def __iter__(self):
+        return self.terms()
+
+    def __len__(self):
+        return self.n_terms
+
+    def close(self):
+        for mapped, file in ((self._postings, self._postings_file), (self._docs, self._docs_file)):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+            file.close()
+        self._lexicon.close()
+        self._lexicon_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_indexer(indexer, prefix, codec='vbyte'):
+    """Write an ``Indexer`` whose terms and postings are already sorted."""
+    with BinaryIndexWriter(prefix, indexer.doc_lengths, positional=indexer.positional, codec=codec) as writer:
+        for term, postings in indexer.get_index().items():
+            postings.sort()
+            writer.add_term(term, postings.doc_ids, postings.tfs, postings.scores, postings.positions)
+
+
+def convert_json_index(json_path, prefix):
+    """
+    Convert a ``{term: [doc_id, ...]}`` JSON index into the binary format.
+
+    The JSON index only stores doc ids, so every posting gets tf 1, a document's
+    length is the number of terms it appears under, and scores are rebuilt from
+    those the same way ``Indexer.calculate_tf_idf`` computes them.
+    """
+    with open(json_path, 'r') as file:
+        inverted_index = json.load(file)
+
+    doc_lengths = Counter(doc_id for doc_ids in inverted_index.values() for doc_id in set(doc_ids))
+    doc_count = len(doc_lengths)
+    with BinaryIndexWriter(prefix, doc_lengths) as writer:
+        for term in sorted(inverted_index):
+            doc_ids = sorted(set(inverted_index[term]))
+            idf = math.log10(doc_count / len(doc_ids)) if doc_ids else 0.0
+            writer.add_term(term, doc_ids, [1] * len(doc_ids), [idf / doc_lengths[doc_id] for doc_id in doc_ids])
+
+
+def load_index(prefix):
+    """Open the binary index at ``prefix``, converting ``prefix.json`` first if that is all there is."""
+    prefix = str(prefix)
+    if not os.path.exists(prefix + LEXICON_SUFFIX) and os.path.exists(prefix + '.json'):
+        print(f"Converting {prefix}.json to the binary index format...")
+        convert_json_index(prefix + '.json', prefix)
+    return BinaryIndexReader(prefix)
+
+
+if __name__ == "__main__":
+    json_path = 'data/inverted_index.json'
+    prefix = 'data/inverted_index'
+
+    convert_json_index(json_path, prefix)
+    print(f"Binary index written to {prefix}{LEXICON_SUFFIX}, {prefix}{POSTINGS_SUFFIX} and {prefix}{DOCS_SUFFIX}")
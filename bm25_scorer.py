@@ -0,0 +1,140 @@
+import heapq
+import math
+from bisect import bisect_left
+from collections import Counter
+from preprocess_index import Preprocessor
+
+# BM25 Scorer Code
+
+
+class BM25Scorer:
+    """
+    Top-k BM25 retrieval over an ``Indexer`` or a ``BinaryIndexReader``.
+
+    Queries are evaluated document-at-a-time with MaxScore pruning. Each term
+    gets an upper bound on the score it can contribute to any document. Terms
+    are ordered by that bound, and once the k-th best score exceeds the summed
+    bounds of the weakest terms, those terms become non-essential: they can no
+    longer introduce a candidate on their own and are only probed, by binary
+    search, for documents the essential terms already produced. Documents
+    whose partial score plus the remaining bounds cannot beat the k-th score
+    are dropped without being fully scored.
+    """
+
+    def __init__(self, index, k1=1.2, b=0.75, preprocessor=None):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.preprocessor = preprocessor or Preprocessor()
+        self._upper_bounds = {}
+        self._bounds_version = getattr(index, 'version', None)
+        # Number of candidates looked at by the last query, for gauging how much pruning saves.
+        self.last_candidates = 0
+
+    def idf(self, df):
+        n = self.index.doc_count
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def term_score(self, tf, doc_length, idf):
+        norm = self.k1 * (1 - self.b + self.b * doc_length / self.index.avg_doc_length)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def upper_bound(self, term, postings, idf):
+        """
+        Highest score ``term`` contributes to any document, cached per term.
+
+        Indexes that change under the scorer, such as ``SegmentedIndex``, carry
+        a ``version``; the cached bounds are dropped whenever it moves.
+        """
+        version = getattr(self.index, 'version', None)
+        if version != self._bounds_version:
+            self._upper_bounds.clear()
+            self._bounds_version = version
+        if term not in self._upper_bounds:
+            doc_length = self.index.doc_length
+            self._upper_bounds[term] = max(
+                (self.term_score(tf, doc_length(doc_id), idf) for doc_id, tf in zip(postings.doc_ids, postings.tfs)),
+                default=0.0,
+            )
+        return self._upper_bounds[term]
+
+    def search(self, query, k=10):
+        """Return the top ``k`` documents for a raw query string."""
+        return self.search_tokens(self.preprocessor.tokenizer(query), k)
+
+    def search_tokens(self, query_tokens, k=10):
+        """Return the top ``k`` documents for already tokenized query terms."""
+        if k <= 0:
+            return []
+        terms = []
+        for term, qtf in Counter(query_tokens).items():
+            postings = self.index.get_postings(term)
+            if not postings.length:
+                continue
+            postings.sort()
+            idf = self.idf(postings.length)
+            terms.append((qtf * self.upper_bound(term, postings, idf), qtf, idf, postings))
+        terms.sort(key=lambda t: t[0])
+
+        n_terms = len(terms)
+        bounds = [t[0] for t in terms]
+        # cumulative[i] is the most terms[0..i] can add to a document together.
+        cumulative = list(bounds)
+        for i in range(1, n_terms):
+            cumulative[i] += cumulative[i - 1]
+
+        positions = [0] * n_terms
+        doc_length = self.index.doc_length
+        heap = []
+        threshold = 0.0
+        first_essential = 0
+        self.last_candidates = 0
+
+        while True:
+            candidate = None
+            for i in range(first_essential, n_terms):
+                postings = terms[i][3]
+                if positions[i] < postings.length:
+                    doc_id = postings.doc_ids[positions[i]]
+                    if candidate is None or doc_id < candidate:
+                        candidate = doc_id
+            if candidate is None:
+                break
+            self.last_candidates += 1
+
+            length = doc_length(candidate)
+            score = 0.0
+            for i in range(first_essential, n_terms):
+                _, qtf, idf, postings = terms[i]
+                pos = positions[i]
+                if pos < postings.length and postings.doc_ids[pos] == candidate:
+                    score += qtf * self.term_score(postings.tfs[pos], length, idf)
+                    positions[i] = pos + 1
+
+            for i in range(first_essential - 1, -1, -1):
+                if len(heap) == k and score + cumulative[i] < threshold:
+                    break
+                _, qtf, idf, postings = terms[i]
+                pos = bisect_left(postings.doc_ids, candidate, positions[i])
+                positions[i] = pos
+                if pos < postings.length and postings.doc_ids[pos] == candidate:
+                    score += qtf * self.term_score(postings.tfs[pos], length, idf)
+
+            # Ties are broken towards the smaller doc id, so results do not depend on pruning.
+            entry = (score, -candidate)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            else:
+                continue
+
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while first_essential < n_terms and cumulative[first_essential] < threshold:
+                    first_essential += 1
+
+        return [
+            {"doc_id": -neg_doc_id, "relevance": score}
+            for score, neg_doc_id in sorted(heap, reverse=True)
+        ]
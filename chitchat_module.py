@@ -1,32 +1,86 @@
-import streamlit as st
-from google import genai
+import threading
+from llm_backend import get_backend
+from summary_cache import summary_cache, normalize_query, prompt_key
+from conversation_memory import ConversationMemory, clip
 
 class ChitChatSystem:
-    def __init__(self):
+    def __init__(self, memory=None):
         """
-        Initialize the Chit-Chat system with Google Gemini client using secrets from Streamlit.
+        Initialize the Chit-Chat system with the shared Google Gemini backend.
+
+        Args:
+            memory (ConversationMemory): Bounds the history sent with each
+                message; by default 1024 tokens, summarised with the backend.
         """
-        # Configure API key
-        self.client = genai.Client(api_key=st.secrets["GEMINI_API_KEY"])
+        self.backend = get_backend()
+        self.memory = memory or ConversationMemory(self.backend.generate)
 
-    def generate_chitchat_response(self, user_input, chat_history=[]):
+    def generate_chitchat_response(self, user_input, chat_history=[], session_id=None):
         """
         Generate a chit-chat response using Google Gemini API.
 
         Args:
             user_input (str): The user's query or input.
             chat_history (list): Previous conversation history.
+            session_id (str): Session the history belongs to, for its rolling summary.
 
         Returns:
             str: The response generated by the model.
         """
-        # Construct chat input with history
-        messages = "\n".join(chat_history) + f"\nUser: {user_input}"
+        # Call the Gemini API, unless the same message in the same conversation was answered before
+        user_input, context = self.prompt_context(user_input, chat_history, session_id)
+        prompt = self.chitchat_prompt(user_input, context)
+        return summary_cache.generate(self.cache_key(user_input, context), lambda: self.backend.generate(prompt))
+
+    def stream_chitchat_response(self, user_input, chat_history=[], session_id=None):
+        """
+        Stream a chit-chat response using Google Gemini API.
+
+        Args:
+            user_input (str): The user's query or input.
+            chat_history (list): Previous conversation history.
+            session_id (str): Session the history belongs to, for its rolling summary.
 
-        # Call the Gemini API
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash-lite", contents=f"Your name is Lolbot. You are a language model which respond based on the previous messages if the user asks for something in extension to the previous messages in the history given to you, or else just respond as usual. Keep every response short, sweet and concise. Here are the messages: {messages}"
+        Yields:
+            str: Chunks of the response as they arrive.
+        """
+        user_input, context = self.prompt_context(user_input, chat_history, session_id)
+        prompt = self.chitchat_prompt(user_input, context)
+        return summary_cache.stream(self.cache_key(user_input, context), lambda: self.backend.generate_stream(prompt))
+
+    def prompt_context(self, user_input, chat_history, session_id):
+        """The user's message, clipped to the memory's token cap, and the bounded history to send with it."""
+        user_input = clip(user_input, self.memory.max_tokens)
+        return user_input, self.memory.context(session_id, chat_history, user_input)
+
+    @staticmethod
+    def cache_key(user_input, context):
+        """Persistent cache key of a reply: the normalised input and the history sent with it."""
+        return prompt_key("chitchat", normalize_query(user_input), list(context))
+
+    @staticmethod
+    def chitchat_prompt(user_input, chat_history):
+        """Construct chat input with history."""
+        messages = "\n".join(chat_history) + f"\nUser: {user_input}"
+        return (
+            f"Your name is Lolbot. You are a language model which respond based on the previous messages if the user asks for something in extension to the previous messages in the history given to you, or else just respond as usual. Keep every response short, sweet and concise. Here are the messages: {messages}"
         )
 
-        # Extract and return the response content
-        return response.text.strip() if hasattr(response, "text") else response.candidates[0].content.strip()
+
+_chitchat_system = None
+_chitchat_system_lock = threading.Lock()
+
+
+def get_chitchat_system():
+    """
+    The process-wide ``ChitChatSystem``, created on first use.
+
+    Streamlit re-runs app.py on every message but keeps imported modules, so
+    the system, and the rolling summary its memory keeps per session, lasts
+    across reruns instead of starting over each turn.
+    """
+    global _chitchat_system
+    with _chitchat_system_lock:
+        if _chitchat_system is None:
+            _chitchat_system = ChitChatSystem()
+        return _chitchat_system
@@ -1,6 +1,7 @@
 import torch
 from transformers import AutoTokenizer
 import joblib
+import threading
 from preprocess_index import Preprocessor
 
 class Classifier:
@@ -42,9 +43,17 @@ class Classifier:
         return confidence
 
 
+# Loaded classifiers, so the model and vectorizer are read once per process rather than once per query
+_classifiers = {}
+_classifiers_lock = threading.Lock()
+
 # Wrapper function for app.py
 def classify_query(query, model_file='model/topic_classifier_model.joblib', vectorizer_file='model/topic_vectorizer.joblib'):
-    classifier = Classifier(model_file=model_file, vectorizer_file=vectorizer_file)
+    key = (str(model_file), str(vectorizer_file))
+    with _classifiers_lock:
+        if key not in _classifiers:
+            _classifiers[key] = Classifier(model_file=model_file, vectorizer_file=vectorizer_file)
+        classifier = _classifiers[key]
     predicted_topic= classifier.classify(query)
     return predicted_topic
 
@@ -1,9 +1,9 @@
 import os
-import json
 import time
 import joblib
 import pandas as pd
 from preprocess_index import Preprocessor
+from document_stream import iter_documents
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.model_selection import train_test_split
 from sklearn.svm import SVC
@@ -18,30 +18,26 @@ class TopicClassifier:
         self.vectorizer = TfidfVectorizer(max_features=60000)
         self.classifier = SVC(kernel='linear')
 
-    def load_data(self, json_file, csv_file):
-        # Load data from the JSON file
-        with open(json_file, 'r') as file:
-            data = json.load(file)
+    def iter_examples(self, json_file, csv_file, csv_chunk_size=10000):
+        """Stream (text, label) pairs from the scraped documents and the general questions CSV."""
+        # Add data from scraped_data.json
+        for topic, doc in iter_documents(json_file):
+            yield f"{doc['title']} {doc['summary']}", topic
+
+        # Load data from the CSV file (general questions dataset) a chunk at a time
+        for chunk in pd.read_csv(csv_file, chunksize=csv_chunk_size):
+            for question, answer in zip(chunk["question"], chunk["answer"]):
+                yield f"{question} {answer}", "General"  # All questions are labeled as 'General'
 
+    def load_data(self, json_file, csv_file):
         texts = []
         labels = []
-        
-        # Add data from scraped_data.json
-        for topic, documents in data.items():
-            for doc in documents:
-                combined_text = f"{doc['title']} {doc['summary']}"
-                texts.append(" ".join(self.preprocessor.tokenizer(combined_text)))
-                labels.append(topic)
-        
-        # Load data from the CSV file (general questions dataset)
-        general_data = pd.read_csv(csv_file)
-        for _, row in general_data.iterrows():
-            question = row["question"]
-            answer = row["answer"]
-            general_text = f"{question} {answer}"
-            texts.append(" ".join(self.preprocessor.tokenizer(general_text)))
-            labels.append("General")  # All questions are labeled as 'General'
-        
+
+        # Only the tokenized text is kept; raw documents are dropped as soon as they are processed
+        for text, label in self.iter_examples(json_file, csv_file):
+            texts.append(" ".join(self.preprocessor.tokenizer(text)))
+            labels.append(label)
+
         return texts, labels
 
     def train(self, texts, labels, test_size=0.25, random_state=42):
@@ -91,7 +87,7 @@ class TopicClassifier:
 
     def predict(self, texts):
         # Tokenize and transform the input texts
-        processed_texts = [" ".join(self.preprocessor.tokenizer(text)) for text in texts]
+        processed_texts = [" ".join(tokens) for tokens in self.preprocessor.tokenize_batch(texts)]
         X = self.vectorizer.transform(processed_texts)
         
         # Predict the labels for the given texts
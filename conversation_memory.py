@@ -0,0 +1,143 @@
+import math
+import threading
+from collections import OrderedDict
+from summary_cache import summary_cache, prompt_key
+
+# Conversation Memory Code
+#
+# Chit-chat prompts carry the conversation so far, but only within a token
+# budget. The last ``recent_turns`` turns go in verbatim; older turns are
+# folded into a rolling summary of the conversation, a few at a time, so each
+# turn is summarised once no matter how long the session runs. The summary
+# and how many turns it covers are kept per session_id. Whatever is
+# assembled, history plus the user's message never exceeds ``max_tokens``:
+# the summary (at most ``summary_tokens``) is kept, and the oldest verbatim
+# turns are left out to make room; the summary itself is only clipped when
+# the budget cannot hold it. One fold sends at most ``fold_tokens`` of turns,
+# so a backlog of unsummarised turns is worked off a batch per message rather
+# than in one ever-growing prompt.
+#
+# Tokens are estimated at four characters each, which is close for English
+# text with Gemini's tokenizer and needs no tokenizer at runtime.
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def clip(text, max_tokens):
+    """The start of ``text``, at most ``max_tokens`` long."""
+    return text[:max(0, max_tokens) * CHARS_PER_TOKEN]
+
+
+def summary_prompt(summary, turns, summary_tokens):
+    prompt = (
+        f"Update the summary of a conversation with its next messages. Keep names, facts and open questions, "
+        f"and answer with the summary alone, within {summary_tokens} tokens.\n\n"
+        f"Summary so far: {summary or '(none)'}\n\nNext messages:\n"
+    )
+    return prompt + "\n".join(turns)
+
+
+class SessionMemory:
+    """The rolling summary of one session and how many of its turns it covers."""
+
+    def __init__(self):
+        self.summary = ""
+        self.summarized = 0
+
+
+class ConversationMemory:
+    """
+    Token-bounded chat history for prompts, with a rolling summary per session.
+
+    ``summarize(prompt)`` generates the summaries, e.g. ``backend.generate``.
+    Older turns are folded into the summary once ``fold_batch`` of them have
+    left the verbatim window; until then they are kept verbatim while the
+    budget allows. State is kept for the ``max_sessions`` most recent sessions.
+    """
+
+    def __init__(self, summarize, max_tokens=1024, recent_turns=6, summary_tokens=200, fold_batch=4, fold_tokens=512,
+                 max_sessions=1000):
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.recent_turns = recent_turns
+        self.summary_tokens = summary_tokens
+        self.fold_batch = fold_batch
+        self.fold_tokens = fold_tokens
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def session(self, session_id):
+        with self._lock:
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                memory = self._sessions[session_id] = SessionMemory()
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return memory
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _fold(self, memory, turns):
+        """
+        Fold the oldest of ``turns`` that fit in ``fold_tokens`` into the session summary.
+
+        At least one turn is folded, clipped if it is longer than the cap. On
+        failure the turns stay unsummarised and are retried later.
+        """
+        budget = self.fold_tokens
+        batch = []
+        for turn in turns:
+            cost = estimate_tokens(turn) + 1
+            if batch and cost > budget:
+                break
+            batch.append(clip(turn, budget - 1))
+            budget -= cost
+        prompt = summary_prompt(memory.summary, batch, self.summary_tokens)
+        key = prompt_key("memory", memory.summary, batch)
+        try:
+            summary = summary_cache.generate(key, lambda: self.summarize(prompt))
+        except Exception:
+            return
+        memory.summary = clip(summary.strip(), self.summary_tokens)
+        memory.summarized += len(batch)
+
+    def context(self, session_id, history, user_input=""):
+        """
+        The history lines to put in the prompt ahead of ``user_input``.
+
+        ``history`` is the whole session so far, oldest first. The summary, if
+        any, comes first as one line.
+        """
+        history = list(history)
+        memory = self.session(session_id)
+        if memory.summarized > len(history):
+            # Not the history this summary was built from; start over.
+            memory.summary, memory.summarized = "", 0
+
+        window_start = max(0, len(history) - self.recent_turns)
+        if window_start - memory.summarized >= self.fold_batch:
+            self._fold(memory, history[memory.summarized:window_start])
+
+        budget = self.max_tokens - estimate_tokens(user_input)
+        summary = ""
+        if memory.summary and budget > 0:
+            summary = clip("Summary of the earlier conversation: " + memory.summary, budget - 1)
+            budget -= estimate_tokens(summary) + 1
+        lines = []
+        # Newest turns first, so the oldest verbatim turns are the ones left out.
+        for turn in reversed(history[memory.summarized:]):
+            cost = estimate_tokens(turn) + 1
+            if cost > budget:
+                break
+            lines.append(turn)
+            budget -= cost
+        lines.reverse()
+        return [summary] + lines if summary else lines
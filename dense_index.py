@@ -0,0 +1,165 @@
+import os
+import math
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+# Dense Index Code
+#
+# Latent semantic vectors for the documents: TruncatedSVD projects the TF-IDF
+# matrix onto its top singular directions, where documents that use different
+# words for the same things end up close together. Vectors are L2-normalised
+# float32, so the inner product is the cosine similarity.
+#
+# Search is approximate, through an inverted file: k-means splits the vectors
+# into ``n_lists`` clusters, the vectors are stored cluster by cluster, and a
+# query only scores the clusters of its ``nprobe`` nearest centroids. Raising
+# ``nprobe`` trades latency for recall; ``nprobe == n_lists`` is exact search.
+# A search restricted to some topics keeps probing clusters, nearest first,
+# until it has found enough documents from those topics.
+
+DENSE_DTYPE = np.float32
+
+
+def _top_k(scores, k):
+    """Indices of the ``k`` highest scores, best first."""
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class DenseIndex:
+    """
+    IVF index over LSA document vectors.
+
+    Built with ``DenseIndex.build(tfidf_matrix, vectors_path)``. The vectors are
+    written to ``vectors_path`` as a raw float32 array and memory-mapped on
+    use; without a path they stay in memory. The index pickles without the
+    map, so it can be saved with the other QASystem state.
+    """
+
+    def __init__(self, svd, centroids, list_offsets, list_rows, vectors_path=None, vectors=None, nprobe=8):
+        self.svd = svd
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.vectors_path = vectors_path
+        self.nprobe = nprobe
+        self._vectors = vectors
+
+    @classmethod
+    def build(cls, tfidf_matrix, vectors_path=None, n_components=128, n_lists=None, nprobe=8, random_state=0):
+        n_docs, n_features = tfidf_matrix.shape
+        n_components = max(1, min(n_components, n_features - 1, n_docs - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=random_state)
+        vectors = normalize(svd.fit_transform(tfidf_matrix)).astype(DENSE_DTYPE)
+
+        n_lists = min(n_lists or max(1, int(math.sqrt(n_docs))), n_docs)
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, n_init=3, random_state=random_state)
+        assignments = kmeans.fit_predict(vectors)
+        centroids = normalize(kmeans.cluster_centers_).astype(DENSE_DTYPE)
+
+        # Store the vectors cluster by cluster, so probing a list reads one contiguous slice.
+        list_rows = np.argsort(assignments, kind='stable')
+        list_offsets = np.searchsorted(assignments[list_rows], np.arange(n_lists + 1))
+        vectors = np.ascontiguousarray(vectors[list_rows])
+
+        if vectors_path is not None:
+            vectors_path = str(vectors_path)
+            os.makedirs(os.path.dirname(vectors_path) or '.', exist_ok=True)
+            # Written under a temporary name and swapped in, so an open map of a previous index stays whole.
+            vectors.tofile(vectors_path + '.tmp')
+            os.replace(vectors_path + '.tmp', vectors_path)
+            vectors = None
+        return cls(svd, centroids, list_offsets, list_rows, vectors_path, vectors, nprobe)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @property
+    def dimensions(self):
+        return self.centroids.shape[1]
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            shape = (len(self.list_rows), self.dimensions)
+            if shape[0]:
+                self._vectors = np.memmap(self.vectors_path, dtype=DENSE_DTYPE, mode='r', shape=shape)
+            else:
+                self._vectors = np.empty(shape, dtype=DENSE_DTYPE)
+        return self._vectors
+
+    def is_valid(self):
+        """Whether the vectors file on disk is the one this index was built with."""
+        if self.vectors_path is None:
+            return True
+        expected = len(self.list_rows) * self.dimensions * np.dtype(DENSE_DTYPE).itemsize
+        return os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) == expected
+
+    def project(self, query_vectors):
+        """LSA vectors for sparse TF-IDF query rows."""
+        return normalize(self.svd.transform(query_vectors)).astype(DENSE_DTYPE)
+
+    def search(self, query_vectors, k=10, nprobe=None, ranges=None):
+        """
+        Top ``k`` documents for each TF-IDF query row, as ``(rows, scores)`` pairs.
+
+        Only the ``nprobe`` lists nearest to the query are scored (default: the
+        index's ``nprobe``). ``ranges`` restricts results to the given
+        ``(start, stop)`` document row ranges; lists are then probed further,
+        ``nprobe`` at a time in centroid order, until ``k`` documents in range
+        are found or every list has been scored.
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        results = []
+        for query in self.project(query_vectors):
+            centroid_scores = self.centroids @ query
+            if ranges is None:
+                if nprobe < self.n_lists:
+                    lists = np.sort(np.argpartition(-centroid_scores, nprobe - 1)[:nprobe])
+                else:
+                    lists = np.arange(self.n_lists)
+                rows, scores = self._score_lists(query, lists)
+            else:
+                rows, scores = self._search_ranges(query, centroid_scores, nprobe, ranges, k)
+            top = _top_k(scores, k)
+            results.append((rows[top], scores[top]))
+        return results
+
+    def _score_lists(self, query, lists):
+        spans = [(self.list_offsets[i], self.list_offsets[i + 1]) for i in lists]
+        positions = np.concatenate([np.arange(start, stop) for start, stop in spans])
+        scores = np.concatenate([self.vectors[start:stop] @ query for start, stop in spans])
+        return self.list_rows[positions], scores
+
+    def _search_ranges(self, query, centroid_scores, nprobe, ranges, k):
+        order = np.argsort(-centroid_scores, kind='stable')
+        found_rows, found_scores = [], []
+        found = probed = 0
+        while probed < self.n_lists and (probed == 0 or found < k):
+            rows, scores = self._score_lists(query, order[probed:probed + nprobe])
+            probed += nprobe
+            allowed = np.zeros(len(rows), dtype=bool)
+            for start, stop in ranges:
+                allowed |= (rows >= start) & (rows < stop)
+            found_rows.append(rows[allowed])
+            found_scores.append(scores[allowed])
+            # Callers drop documents that do not score above zero, so only those count.
+            found += int((scores[allowed] > 0).sum())
+        return np.concatenate(found_rows), np.concatenate(found_scores)
+
+    def exact_search(self, query_vectors, k=10, ranges=None):
+        return self.search(query_vectors, k, self.n_lists, ranges)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.vectors_path is not None:
+            state['_vectors'] = None
+        return state
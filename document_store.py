@@ -0,0 +1,174 @@
+import os
+import mmap
+from array import array
+from collections.abc import Mapping
+
+# Document Store Code
+#
+# Scraped documents are kept column by column rather than as a list of dicts:
+# revision ids in an int64 array, titles and urls in lists, topics as small
+# integer codes. A dict maps each revision_id to its row, so looking up the
+# top hits of a query costs one hash probe each. Summaries, by far the longest
+# field, are written one after another to a UTF-8 file next to the store and
+# read through an mmap only when a document's summary is actually used.
+
+FIELDS = ('revision_id', 'title', 'summary', 'url', 'topic')
+
+
+class Document(Mapping):
+    """Read-only view of one row of a ``DocumentStore``, used like the scraped document dict."""
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, field):
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self.store, field)(self.row)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"Document(revision_id={self['revision_id']!r}, title={self['title']!r})"
+
+
+class DocumentStore:
+    """
+    Columnar document table keyed by ``revision_id``.
+
+    Built with ``DocumentStore.build(documents, summaries_path)``. Without a
+    ``summaries_path`` the summaries stay in memory instead of on disk. The
+    store pickles without its summary map, so it can be saved alongside the
+    models and reopened later.
+    """
+
+    def __init__(self, summaries_path=None):
+        self.summaries_path = str(summaries_path) if summaries_path else None
+        self.revision_ids = array('q')
+        self.titles = []
+        self.urls = []
+        self.topic_codes = array('H')
+        self.topic_names = []
+        self.summary_offsets = array('Q', [0])
+        self._rows = {}
+        self._topic_index = {}
+        self._summaries = None if self.summaries_path else []
+        self._map = None
+
+    @classmethod
+    def build(cls, documents, summaries_path=None):
+        store = cls(summaries_path)
+        if store.summaries_path is None:
+            for doc in documents:
+                store._append(doc, None)
+            return store
+
+        # Written under a temporary name and swapped in, so readers of a previous store keep a whole file.
+        os.makedirs(os.path.dirname(store.summaries_path) or '.', exist_ok=True)
+        with open(store.summaries_path + '.tmp', 'wb') as file:
+            for doc in documents:
+                store._append(doc, file)
+        os.replace(store.summaries_path + '.tmp', store.summaries_path)
+        return store
+
+    def _append(self, doc, file):
+        row = len(self.revision_ids)
+        self._rows.setdefault(doc['revision_id'], row)
+        self.revision_ids.append(doc['revision_id'])
+        self.titles.append(doc.get('title', ''))
+        self.urls.append(doc.get('url', ''))
+
+        topic = doc.get('topic')
+        if topic not in self._topic_index:
+            self._topic_index[topic] = len(self.topic_names)
+            self.topic_names.append(topic)
+        self.topic_codes.append(self._topic_index[topic])
+
+        summary = doc.get('summary', '')
+        if file is None:
+            self._summaries.append(summary)
+            self.summary_offsets.append(self.summary_offsets[-1] + len(summary))
+        else:
+            encoded = summary.encode('utf-8')
+            file.write(encoded)
+            self.summary_offsets.append(self.summary_offsets[-1] + len(encoded))
+
+    def is_valid(self):
+        """Whether the summaries file on disk is the one this store was built with."""
+        if self.summaries_path is None:
+            return True
+        return os.path.exists(self.summaries_path) and os.path.getsize(self.summaries_path) == self.summary_offsets[-1]
+
+    # Columns
+
+    def revision_id(self, row):
+        return self.revision_ids[row]
+
+    def title(self, row):
+        return self.titles[row]
+
+    def url(self, row):
+        return self.urls[row]
+
+    def topic(self, row):
+        return self.topic_names[self.topic_codes[row]]
+
+    def summary(self, row):
+        if self._summaries is not None:
+            return self._summaries[row]
+        if self._map is None:
+            with open(self.summaries_path, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        return self._map[self.summary_offsets[row]:self.summary_offsets[row + 1]].decode('utf-8')
+
+    def summaries(self):
+        for row in range(len(self)):
+            yield self.summary(row)
+
+    # Lookups
+
+    def row(self, revision_id):
+        return self._rows.get(revision_id)
+
+    def get(self, revision_id, default=None):
+        row = self._rows.get(revision_id)
+        return Document(self, row) if row is not None else default
+
+    def fetch(self, revision_ids):
+        """Documents for ``revision_ids`` in the order given, skipping ids that are not stored."""
+        documents = []
+        for revision_id in revision_ids:
+            row = self._rows.get(revision_id)
+            if row is not None:
+                documents.append(Document(self, row))
+        return documents
+
+    def __getitem__(self, row):
+        return Document(self, row)
+
+    def __contains__(self, revision_id):
+        return revision_id in self._rows
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield Document(self, row)
+
+    def __len__(self):
+        return len(self.revision_ids)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_map'] = None
+        return state
@@ -0,0 +1,134 @@
+import os
+import re
+import json
+
+# Document Stream Code
+#
+# The scraper writes documents grouped by topic, {"Health": [{...}, ...], ...},
+# which json.load can only hand back all at once. The readers below yield
+# (topic, doc) records one at a time instead, from that grouped layout or from
+# a JSONL variant with one document (carrying its own "topic") per line, so
+# consumers only ever hold the documents they are working on.
+
+WHITESPACE = re.compile(r'\s*')
+
+
+class _GroupedJSONReader:
+    """Incremental parser for the ``{topic: [doc, ...]}`` layout."""
+
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """Skip whitespace and return the next character, or '' at the end of the file."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Malformed document file {self.file.name}: expected one of {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def _value(self):
+        # Keys are strings and documents are objects, so a value that fails to
+        # decode is incomplete until the end of the file proves otherwise.
+        self._peek()
+        while True:
+            try:
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            topic = self._value()
+            self._expect(':')
+            self._expect('[')
+            if self._peek() == ']':
+                self.pos += 1
+            else:
+                while True:
+                    yield topic, self._value()
+                    if self._expect(',]') == ']':
+                        break
+            if self._expect(',}') == '}':
+                return
+
+
+def iter_grouped_json(path, chunk_size=1 << 16):
+    with open(path, 'r') as file:
+        yield from _GroupedJSONReader(file, chunk_size)
+
+
+def iter_jsonl(path):
+    with open(path, 'r') as file:
+        for line in file:
+            if line.strip():
+                doc = json.loads(line)
+                yield doc.get('topic'), doc
+
+
+def iter_documents(path):
+    """Yield ``(topic, doc)`` records from a grouped ``.json`` or a ``.jsonl`` document file."""
+    if str(path).endswith('.jsonl'):
+        return iter_jsonl(path)
+    return iter_grouped_json(path)
+
+
+def convert_to_jsonl(json_path, jsonl_path):
+    """Rewrite a grouped document file as JSONL, one document per line."""
+    with open(jsonl_path, 'w') as file:
+        for topic, doc in iter_grouped_json(json_path):
+            file.write(json.dumps(dict(doc, topic=topic)) + "\n")
+
+
+class DocumentStream:
+    """
+    Re-iterable view of a document file.
+
+    Every iteration streams the file again from the start, so the stream can be
+    handed to several generator pipelines without keeping the corpus in memory.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Document file not found: {self.path}")
+
+    def __iter__(self):
+        return iter_documents(self.path)
+
+    def documents(self):
+        for _, doc in self:
+            yield doc
+
+
+if __name__ == "__main__":
+    json_path = 'data/scraped_data.json'
+    jsonl_path = 'data/scraped_data.jsonl'
+
+    convert_to_jsonl(json_path, jsonl_path)
+    print(f"Converted {json_path} to {jsonl_path}")
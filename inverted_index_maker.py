@@ -1,40 +1,111 @@
+import os
 import json
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
 from tqdm import tqdm
 from preprocess_index import Preprocessor, Indexer
+from binary_index import write_indexer
+from document_stream import iter_documents
+
+# Set in each worker process by _init_worker, so the stopword set and stemmer
+# are built once per worker rather than once per block.
+_worker_preprocessor = None
+
+
+def _init_worker():
+    global _worker_preprocessor
+    _worker_preprocessor = Preprocessor()
+
+
+def _index_block(documents, positional=False):
+    """Index one block of (doc_id, text) pairs into a partial, term-sorted index."""
+    indexer = Indexer(positional=positional)
+    tokenized = _worker_preprocessor.tokenize_batch(text for _, text in documents)
+    for (doc_id, _), tokenized_text in zip(documents, tokenized):
+        indexer.generate_inverted_index(doc_id, tokenized_text)
+    indexer.sort_terms()
+    return indexer
+
+
+INDEX_FORMATS = ('json', 'binary')
+
 
 class InvertedIndexer:
-    def __init__(self, json_file_path, index_output_file):
+    def __init__(self, json_file_path, index_output_file, index_format=None, workers=1, block_size=2000, positional=False, codec='vbyte'):
+        """
+        ``index_format`` defaults to 'json' for an ``index_output_file`` ending
+        in ``.json`` and to 'binary' otherwise, in which case the output path is
+        the prefix of the ``.lex``, ``.post`` and ``.docs`` files.
+        """
+        if index_format is None:
+            index_format = 'json' if str(index_output_file).endswith('.json') else 'binary'
+        if index_format not in INDEX_FORMATS:
+            raise ValueError(f"Unknown index format {index_format!r}, expected one of {INDEX_FORMATS}")
         self.json_file_path = json_file_path
         self.index_output_file = index_output_file
+        self.index_format = index_format
+        self.workers = workers
+        self.block_size = block_size
+        self.positional = positional
+        self.codec = codec
         self.preprocessor = Preprocessor()
-        self.indexer = Indexer()
+        self.indexer = Indexer(positional=positional)
 
-    def process_and_index(self):
-        with open(self.json_file_path, 'r') as file:
-            data = json.load(file)
+    def _documents(self):
+        for topic, doc in iter_documents(self.json_file_path):
+            yield doc['revision_id'], f"{doc['title']} {doc['summary']}"
 
-        print("Processing and indexing documents...")
-        for topic, documents in tqdm(data.items(), desc="Processing Topics"):
-            for doc in documents:
-                doc_id = doc['revision_id']
-                text = f"{doc['title']} {doc['summary']}"  
-                tokenized_text = self.preprocessor.tokenizer(text)
-                self.indexer.generate_inverted_index(doc_id, tokenized_text)
-                
+    def _build_serial(self):
+        documents = tqdm(self._documents(), desc="Processing Documents")
+        for doc_id, text in documents:
+            tokenized_text = self.preprocessor.tokenizer(text)
+            self.indexer.generate_inverted_index(doc_id, tokenized_text)
         self.indexer.sort_terms()
+
+    def _build_parallel(self):
+        documents = self._documents()
+        blocks = iter(lambda: list(islice(documents, self.block_size)), [])
+
+        # Only a couple of blocks per worker are read ahead of the pool, so the
+        # corpus is never fully in memory. Results are collected in submission
+        # order, which keeps the merge identical to a serial build.
+        partial_indexes = []
+        pending = deque()
+        with Pool(processes=self.workers, initializer=_init_worker) as pool:
+            for block in tqdm(blocks, desc="Processing Blocks"):
+                pending.append(pool.apply_async(_index_block, (block, self.positional)))
+                if len(pending) >= 2 * self.workers:
+                    partial_indexes.append(pending.popleft().get())
+            while pending:
+                partial_indexes.append(pending.popleft().get())
+        self.indexer = Indexer.merge_blocks(partial_indexes)
+
+    def process_and_index(self):
+        print("Processing and indexing documents...")
+        if self.workers > 1:
+            self._build_parallel()
+        else:
+            self._build_serial()
+
         self.indexer.add_skip_connections()
         self.indexer.calculate_tf_idf()
 
-        print(f"Saving the inverted index to {self.index_output_file}...")
-        inverted_index = {term: postings.traverse_list() for term, postings in self.indexer.get_index().items()}
-        with open(self.index_output_file, 'w') as file:
-            json.dump(inverted_index, file, indent=4)
+        if self.index_format == 'binary':
+            print(f"Saving the binary inverted index to {self.index_output_file}.*...")
+            write_indexer(self.indexer, self.index_output_file, codec=self.codec)
+        else:
+            print(f"Saving the inverted index to {self.index_output_file}...")
+            inverted_index = {term: postings.traverse_list() for term, postings in self.indexer.get_index().items()}
+            with open(self.index_output_file, 'w') as file:
+                json.dump(inverted_index, file, indent=4)
 
         print("Indexing complete!")
 
 if __name__ == "__main__":
-    json_file_path = 'data/wiki_data.json'
-    index_output_file = 'data/wiki_inverted_index.json'
+    json_file_path = 'data/scraped_data.json'
+    index_output_file = 'data/inverted_index'
+    workers = os.cpu_count() or 1
 
-    inverted_indexer = InvertedIndexer(json_file_path, index_output_file)
-    inverted_indexer.process_and_index()
\ No newline at end of file
+    inverted_indexer = InvertedIndexer(json_file_path, index_output_file, workers=workers)
+    inverted_indexer.process_and_index()
@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import random
+import threading
+from abc import ABC, abstractmethod
+import http.client
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# LLM Backend Code
+#
+# Every Gemini call in the app goes through one long-lived backend, so the
+# client and its pooled keep-alive connections are set up once per process
+# instead of once per call. The backend bounds how many calls are in flight
+# at once and retries transient failures (rate limits, 5xx, dropped
+# connections) with jittered exponential backoff, drawing on a shared retry
+# budget so an outage is not multiplied by retries.
+#
+# LLM_BACKEND=stub swaps Gemini for a local stub server (``python -m
+# llm_backend``) that answers with simulated Gemini latency, so the whole
+# pipeline can be load-tested offline.
+
+MODEL = "gemini-2.0-flash-lite"
+RETRY_STATUS = (429, 500, 502, 503, 504)
+STUB_URL = "http://127.0.0.1:8765"
+
+
+class TransientError(Exception):
+    """A failed call that is worth retrying."""
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a fraction of calls.
+
+    Every call deposits ``ratio`` tokens, up to ``burst``, and every retry
+    spends one, so under a sustained outage at most about ``ratio`` extra
+    calls are made per call.
+    """
+
+    def __init__(self, ratio=0.1, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = float(burst)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class LLMBackend(ABC):
+    """
+    Shared entry point for LLM calls: bounded concurrency and budgeted retries.
+
+    Subclasses implement ``_generate(prompt)``, raising ``TransientError`` for
+    failures that may succeed on retry.
+    """
+
+    def __init__(self, max_concurrency=8, max_retries=3, backoff=0.5, max_backoff=8.0, retry_budget=None):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_budget = retry_budget or RetryBudget()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def generate(self, prompt):
+        """Text generated for ``prompt``."""
+        with self._lock:
+            self.calls += 1
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                with self._slots:
+                    return self._generate(prompt)
+            except TransientError:
+                if attempt >= self.max_retries or not self.retry_budget.withdraw():
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            # Full jitter, so callers that failed together do not retry together.
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def generate_stream(self, prompt):
+        """
+        Text generated for ``prompt``, yielded in chunks as it arrives.
+
+        The call holds a concurrency slot until the stream is exhausted or
+        closed. Failures are only retried before the first chunk, so no text
+        is ever yielded twice.
+        """
+        with self._lock:
+            self.calls += 1
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            started = False
+            try:
+                with self._slots:
+                    for chunk in self._generate_stream(prompt):
+                        started = True
+                        yield chunk
+                    return
+            except TransientError:
+                if started or attempt >= self.max_retries or not self.retry_budget.withdraw():
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    @abstractmethod
+    def _generate(self, prompt):
+        """Text generated for ``prompt`` in one attempt."""
+
+    def _generate_stream(self, prompt):
+        # Backends without streaming yield the whole completion at once.
+        yield self._generate(prompt)
+
+    def stats(self):
+        return {
+            "backend": type(self).__name__,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "retry_tokens": self.retry_budget.tokens,
+        }
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through one ``genai.Client``, whose HTTP connections are reused across calls."""
+
+    def __init__(self, api_key, model=MODEL, timeout=60, **options):
+        # Imported here, so the stub backend runs without the Gemini SDK.
+        import httpx
+        from google import genai
+        from google.genai import errors, types
+
+        super().__init__(**options)
+        self.model = model
+        self.errors = errors
+        # The SDK talks HTTP through httpx, whose dropped connections and timeouts are not OSErrors.
+        self.transport_errors = httpx.TransportError
+        self.client = genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=int(timeout * 1000)))
+
+    def _generate(self, prompt):
+        try:
+            response = self.client.models.generate_content(model=self.model, contents=prompt)
+        except self.errors.APIError as e:
+            if e.code in RETRY_STATUS:
+                raise TransientError(str(e)) from e
+            raise
+        except self.transport_errors as e:
+            raise TransientError(str(e)) from e
+        return response.text.strip() if hasattr(response, "text") else response.candidates[0].content.strip()
+
+    def _generate_stream(self, prompt):
+        try:
+            for chunk in self.client.models.generate_content_stream(model=self.model, contents=prompt):
+                if chunk.text:
+                    yield chunk.text
+        except self.errors.APIError as e:
+            if e.code in RETRY_STATUS:
+                raise TransientError(str(e)) from e
+            raise
+        except self.transport_errors as e:
+            raise TransientError(str(e)) from e
+
+
+class StubBackend(LLMBackend):
+    """Client for the local stub server, with one keep-alive connection per thread."""
+
+    def __init__(self, url=STUB_URL, timeout=60, **options):
+        super().__init__(**options)
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def _request(self, prompt, stream):
+        connection = self._connection()
+        try:
+            body = json.dumps({"prompt": prompt, "stream": stream})
+            connection.request("POST", "/generate", body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            self._drop_connection(connection)
+            raise TransientError(str(e)) from e
+        if response.status != 200:
+            body = response.read()
+            if response.status in RETRY_STATUS:
+                raise TransientError(f"stub server returned {response.status}")
+            raise RuntimeError(f"stub server returned {response.status}: {body[:200]!r}")
+        return connection, response
+
+    def _drop_connection(self, connection):
+        # The next attempt opens a new one.
+        connection.close()
+        self._local.connection = None
+
+    def _generate(self, prompt):
+        connection, response = self._request(prompt, stream=False)
+        try:
+            return json.loads(response.read())["text"].strip()
+        except (OSError, http.client.HTTPException) as e:
+            self._drop_connection(connection)
+            raise TransientError(str(e)) from e
+
+    def _generate_stream(self, prompt):
+        # The server sends one JSON object per line, as chunks of a chunked response.
+        connection, response = self._request(prompt, stream=True)
+        try:
+            for line in iter(response.readline, b""):
+                yield json.loads(line)["text"]
+        except (OSError, http.client.HTTPException) as e:
+            self._drop_connection(connection)
+            raise TransientError(str(e)) from e
+        finally:
+            if not response.isclosed():
+                # Abandoned mid-stream: the rest of the response would desynchronise the connection.
+                self._drop_connection(connection)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend():
+    """The backend selected by LLM_BACKEND: ``gemini`` (default) or ``stub`` at LLM_STUB_URL."""
+    if os.environ.get("LLM_BACKEND", "gemini") == "stub":
+        return StubBackend(os.environ.get("LLM_STUB_URL", STUB_URL))
+    import streamlit as st
+    return GeminiBackend(st.secrets["GEMINI_API_KEY"])
+
+
+def get_backend():
+    """The process-wide LLM backend, created on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend, e.g. with a ``StubBackend`` for a load test."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# Stub Server Code
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        # Gemini latency is roughly log-normal: mostly near the median, with a long tail.
+        time.sleep(server.latency * random.lognormvariate(0, server.jitter))
+        if random.random() < server.error_rate:
+            self._reply(503, {"error": "simulated overload"})
+            return
+        text = " ".join(request["prompt"].split()[-server.reply_words:]) or "OK"
+        if request.get("stream"):
+            self._stream(text.split(" "), server.token_interval)
+        else:
+            self._reply(200, {"text": text})
+
+    def _stream(self, words, interval):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(interval)
+            line = json.dumps({"text": word if i == 0 else " " + word}).encode() + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stub(host="127.0.0.1", port=8765, latency=0.8, jitter=0.3, error_rate=0.0, reply_words=60, token_interval=0.02):
+    """
+    Start the stub server in a daemon thread and return it.
+
+    Each request sleeps for a log-normal delay with median ``latency`` seconds
+    and fails with a 503 at ``error_rate``, then echoes the end of the prompt.
+    Streamed replies send a word every ``token_interval`` seconds.
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.reply_words = reply_words
+    server.token_interval = token_interval
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local stub server simulating Gemini latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.8, help="median seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.3, help="log-normal sigma of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="seconds between streamed words")
+    args = parser.parse_args()
+
+    server = serve_stub(
+        args.host, args.port, args.latency, args.jitter, args.error_rate, token_interval=args.token_interval
+    )
+    print(f"Stub LLM server on http://{args.host}:{args.port} (set LLM_BACKEND=stub to use it)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,97 @@
+import re
+import numpy as np
+from array import array
+
+# Passage Index Code
+#
+# Summaries are cut into passages of whole sentences, packed until a passage
+# holds at least MIN_WORDS words and never more than MAX_WORDS. Scraped
+# summaries have their punctuation stripped, so without sentence ends a
+# passage is simply a window of MAX_WORDS words. Each passage is stored as a
+# character span of its document's summary and vectorised once, at build
+# time, with the document vectorizer; answering a query then scores just the
+# passages of its top documents with one sparse product.
+
+WORD = re.compile(r'\S+')
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*$')
+MIN_WORDS = 15
+MAX_WORDS = 50
+
+
+def split_passages(text, min_words=MIN_WORDS, max_words=MAX_WORDS):
+    """``(start, end)`` character spans of the passages of ``text``."""
+    spans = []
+    start = end = None
+    count = 0
+    for match in WORD.finditer(text):
+        if start is None:
+            start = match.start()
+        end = match.end()
+        count += 1
+        if count >= max_words or (count >= min_words and SENTENCE_END.search(match.group())):
+            spans.append((start, end))
+            start = None
+            count = 0
+    if start is not None:
+        spans.append((start, end))
+    return spans
+
+
+class PassageIndex:
+    """
+    Passage spans of every document, with their TF-IDF vectors.
+
+    Passages are numbered document by document, so ``doc_offsets[row]`` to
+    ``doc_offsets[row + 1]`` are the passages of document ``row``.
+    """
+
+    def __init__(self, doc_offsets, starts, ends, matrix):
+        self.doc_offsets = doc_offsets
+        self.starts = starts
+        self.ends = ends
+        self.matrix = matrix
+
+    @classmethod
+    def build(cls, documents, vectorizer, min_words=MIN_WORDS, max_words=MAX_WORDS):
+        """Split and vectorise the summaries of a ``DocumentStore`` with a fitted vectorizer."""
+        doc_offsets = array('Q', [0])
+        starts = array('I')
+        ends = array('I')
+        texts = []
+        for summary in documents.summaries():
+            for start, end in split_passages(summary, min_words, max_words):
+                starts.append(start)
+                ends.append(end)
+                texts.append(summary[start:end])
+            doc_offsets.append(len(starts))
+        return cls(doc_offsets, starts, ends, vectorizer.transform(texts))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def passage_rows(self, doc_rows):
+        """Passage numbers of the given documents, document by document."""
+        ranges = [np.arange(self.doc_offsets[row], self.doc_offsets[row + 1]) for row in doc_rows]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+    def top_passages(self, query_vector, doc_rows, top_n=3):
+        """
+        Best ``(doc_row, start, end, score)`` passages of the given documents for a TF-IDF query row.
+
+        ``top_n=None`` returns every matching passage, best first. Ties keep
+        document rank order. When no passage shares a term with the
+        query, the opening passages of the documents are returned instead.
+        """
+        doc_rows = list(doc_rows)
+        passages = self.passage_rows(doc_rows)
+        if not len(passages) or (top_n is not None and top_n <= 0):
+            return []
+        owners = np.repeat(doc_rows, [self.doc_offsets[row + 1] - self.doc_offsets[row] for row in doc_rows])
+
+        scores = (self.matrix[passages] @ query_vector.T).toarray().ravel()
+        best = np.argsort(-scores, kind='stable')[:top_n]
+        best = best[scores[best] > 0]
+        if not len(best):
+            first = [(row, self.doc_offsets[row]) for row in doc_rows if self.doc_offsets[row + 1] > self.doc_offsets[row]]
+            return [(row, self.starts[p], self.ends[p], 0.0) for row, p in first[:top_n]]
+        return [(int(owners[i]), self.starts[passages[i]], self.ends[passages[i]], float(scores[i])) for i in best]
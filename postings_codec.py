@@ -0,0 +1,203 @@
+import sys
+import struct
+from array import array
+from bisect import bisect_left
+
+# Postings Codec Code
+#
+# Sorted integer lists (positions within a document, doc ids within a postings
+# list) are stored as gaps between consecutive values, and the gaps as
+# variable-byte integers: seven bits per byte, low bits first, with the high
+# bit set on every byte except the last one of a number. Small gaps, which is
+# what sorted lists mostly contain, take a single byte.
+
+
+def encode_varint(values):
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data):
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def delta_encode(values):
+    """Gaps between consecutive values of a sorted list; the first value is kept as is."""
+    previous = 0
+    gaps = []
+    for value in values:
+        gaps.append(value - previous)
+        previous = value
+    return gaps
+
+
+def delta_decode(gaps):
+    total = 0
+    values = []
+    for gap in gaps:
+        total += gap
+        values.append(total)
+    return values
+
+
+def encode_positions(positions):
+    return encode_varint(delta_encode(positions))
+
+
+def decode_positions(data):
+    return delta_decode(decode_varint(data))
+
+
+# Doc id columns
+#
+# A postings list's doc ids are stored with one of three codecs:
+#
+#   raw      int64 per doc id
+#   vbyte    gaps as variable-byte integers
+#   bitpack  gaps bit-packed at the width of the largest gap in the block
+#
+# The compressed codecs cut the list into blocks of BLOCK_SIZE doc ids, each
+# encoded on its own with gaps restarting from the previous block's last doc
+# id. A skip table in front of the blocks stores, per block, its last doc id
+# and the offset where it ends, so a reader can jump straight to the block
+# that may hold a doc id and decode only that block.
+
+BLOCK_SIZE = 128
+CODECS = ('raw', 'vbyte', 'bitpack')
+SKIP_ENTRY = struct.Struct('<qI')  # last doc id in the block, end offset of the block
+
+
+def pack_bits(values, width):
+    packed = 0
+    for i, value in enumerate(values):
+        packed |= value << (i * width)
+    return packed.to_bytes((len(values) * width + 7) // 8, 'little')
+
+
+def unpack_bits(data, width, count):
+    packed = int.from_bytes(data, 'little')
+    mask = (1 << width) - 1
+    return [(packed >> (i * width)) & mask for i in range(count)]
+
+
+def _encode_block(gaps, codec):
+    if codec == 'vbyte':
+        return encode_varint(gaps)
+    width = max(gaps).bit_length()
+    return bytes([width]) + pack_bits(gaps, width)
+
+
+def _decode_block(data, codec, count):
+    if codec == 'vbyte':
+        return decode_varint(data)
+    return unpack_bits(data[1:], data[0], count)
+
+
+def n_blocks(df):
+    return (df + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+
+def encode_doc_ids(doc_ids, codec):
+    """Encode a sorted doc id column, returning the bytes stored in the postings file."""
+    if codec == 'raw':
+        return array('q', doc_ids).tobytes() if sys.byteorder == 'little' else struct.pack(f'<{len(doc_ids)}q', *doc_ids)
+    if codec not in CODECS:
+        raise ValueError(f"Unknown postings codec {codec!r}")
+
+    skips = bytearray()
+    blocks = bytearray()
+    previous = 0
+    for start in range(0, len(doc_ids), BLOCK_SIZE):
+        block = doc_ids[start:start + BLOCK_SIZE]
+        gaps = [block[0] - previous] + [b - a for a, b in zip(block, block[1:])]
+        blocks += _encode_block(gaps, codec)
+        skips += SKIP_ENTRY.pack(block[-1], len(blocks))
+        previous = block[-1]
+    return bytes(skips + blocks)
+
+
+def encoded_size(data, offset, df, codec):
+    """Number of bytes the doc id column of ``df`` postings takes at ``offset``."""
+    if codec == 'raw':
+        return 8 * df
+    blocks = n_blocks(df)
+    if not blocks:
+        return 0
+    last_end = SKIP_ENTRY.unpack_from(data, offset + (blocks - 1) * SKIP_ENTRY.size)[1]
+    return blocks * SKIP_ENTRY.size + last_end
+
+
+def decode_doc_ids(data, offset, df, codec):
+    """Decode a whole doc id column into a list."""
+    if codec == 'raw':
+        return list(struct.unpack_from(f'<{df}q', data, offset))
+    return BlockCursor(data, offset, df, codec).decode_all()
+
+
+class BlockCursor:
+    """
+    Forward-only cursor over an encoded doc id column.
+
+    ``next_geq`` consults the skip table to find the first block whose last doc
+    id reaches the target and only decodes that block, so long lists that are
+    mostly skipped over are never decoded in full.
+    """
+
+    def __init__(self, data, offset, df, codec):
+        self.data = data
+        self.df = df
+        self.codec = codec
+        self.n_blocks = n_blocks(df)
+        self.skip_offset = offset
+        self.blocks_offset = offset + self.n_blocks * SKIP_ENTRY.size
+        self.block = -1
+        self.values = []
+        self.i = 0
+        self.blocks_decoded = 0
+
+    def _skip_entry(self, block):
+        return SKIP_ENTRY.unpack_from(self.data, self.skip_offset + block * SKIP_ENTRY.size)
+
+    def _load(self, block):
+        previous, start = self._skip_entry(block - 1) if block else (0, 0)
+        end = self._skip_entry(block)[1]
+        count = min(BLOCK_SIZE, self.df - block * BLOCK_SIZE)
+        gaps = _decode_block(self.data[self.blocks_offset + start:self.blocks_offset + end], self.codec, count)
+        self.values = delta_decode([gaps[0] + previous] + gaps[1:])
+        self.block = block
+        self.i = 0
+        self.blocks_decoded += 1
+
+    def decode_all(self):
+        doc_ids = []
+        for block in range(self.n_blocks):
+            self._load(block)
+            doc_ids.extend(self.values)
+        return doc_ids
+
+    def next_geq(self, target):
+        """Advance to the first doc id >= ``target`` and return it, or None once the list is exhausted."""
+        block = max(self.block, 0)
+        while block < self.n_blocks and self._skip_entry(block)[0] < target:
+            block += 1
+        if block == self.n_blocks:
+            self.block = self.n_blocks
+            return None
+        if block != self.block:
+            self._load(block)
+        self.i = bisect_left(self.values, target, self.i)
+        return self.values[self.i]
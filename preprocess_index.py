@@ -3,8 +3,13 @@ from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer
 import nltk
 import math
-from collections import OrderedDict
-import math
+import heapq
+from array import array
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from postings_codec import encode_positions, decode_positions
 
 # Preprocessor Code
 
@@ -12,129 +17,209 @@ import math
 
 nltk.data.path.append('data/nltk_data')
 
+# Runs of ASCII letters and digits. Finding them directly yields the same words
+# as replacing everything else with spaces and splitting on whitespace.
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+")
+
 class Preprocessor:
-    def __init__(self):
+    def __init__(self, stem_cache_size=100000):
         self.stop_words = set(stopwords.words('english'))
         self.ps = PorterStemmer()
+        # The vocabulary is small next to the token stream, so most stems are cache hits.
+        self._stem = lru_cache(maxsize=stem_cache_size)(self.ps.stem)
 
     def tokenizer(self, text):
-        text = text.lower()
-        text = re.sub(r"[^A-Za-z0-9]+", " ", text)
-        text = re.sub(r"\s+", " ", text)  
-        tokens = [self.ps.stem(word) for word in text.split() if word not in self.stop_words]
-        return tokens
+        stop_words = self.stop_words
+        stem = self._stem
+        return [stem(word) for word in TOKEN_PATTERN.findall(text.lower()) if word not in stop_words]
 
-# Linked List Code
+    def tokenize_batch(self, texts):
+        """Lazily tokenize an iterable of texts, yielding one token list per text."""
+        tokenizer = self.tokenizer
+        for text in texts:
+            yield tokenizer(text)
 
-class Node:
+    def stem_cache_info(self):
+        return self._stem.cache_info()
 
-    def __init__(self, value=None, next=None):
-        self.value = value
-        self.next = next
-        self.skip = None
-        self.score = 0.0
+# Postings List Code
 
+class PostingsList:
+    """
+    Array-backed postings list.
+
+    Doc ids, term frequencies and scores live in parallel typed arrays, one
+    posting per (term, doc). Postings are appended in arrival order during the
+    build and sorted once, the first time the list is read. Positional lists
+    also keep, per posting, the term's positions in the document as a
+    delta/variable-byte encoded ``bytes`` object. Skip pointers are implicit: every ``skip_length``-th posting skips
+    ahead by ``skip_length`` positions, so no per-posting objects are needed.
+    """
+
+    __slots__ = ('doc_ids', 'tfs', 'scores', 'positions', 'length', 'n_skips', 'idf', 'skip_length', '_sorted')
 
-class LinkedList:
     def __init__(self):
-        self.start_node = None
-        self.end_node = None
+        self.doc_ids = array('q')
+        self.tfs = array('I')
+        self.scores = array('d')
+        self.positions = None
         self.length, self.n_skips, self.idf = 0, 0, 0.0
         self.skip_length = None
+        self._sorted = True
+
+    def insert_at_end(self, value, tf=1, positions=None):
+        if self.length and value < self.doc_ids[-1]:
+            self._sorted = False
+        self.doc_ids.append(value)
+        self.tfs.append(tf)
+        self.scores.append(0.0)
+        if positions is not None:
+            if self.positions is None:
+                self.positions = []
+            self.positions.append(positions)
+        self.length += 1
+
+    def sort(self):
+        """Sort the postings by doc id, once, if anything arrived out of order."""
+        if self._sorted:
+            return
+        order = sorted(range(self.length), key=self.doc_ids.__getitem__)
+        self.doc_ids = array('q', [self.doc_ids[i] for i in order])
+        self.tfs = array('I', [self.tfs[i] for i in order])
+        self.scores = array('d', [self.scores[i] for i in order])
+        if self.positions is not None:
+            self.positions = [self.positions[i] for i in order]
+        self._sorted = True
+
+    def extend(self, other):
+        """Append another list's postings after this one's, as if inserted one by one."""
+        if other.length and self.length and other.doc_ids[0] < self.doc_ids[-1]:
+            self._sorted = False
+        self._sorted = self._sorted and other._sorted
+        self.doc_ids.extend(other.doc_ids)
+        self.tfs.extend(other.tfs)
+        self.scores.extend(other.scores)
+        if other.positions is not None:
+            if self.positions is None:
+                self.positions = []
+            self.positions.extend(other.positions)
+        self.length += other.length
+
+    def positions_at(self, i):
+        """Decoded positions of the term in the document of the ``i``-th posting."""
+        if self.positions is None:
+            raise ValueError("Postings list was built without positions")
+        return decode_positions(self.positions[i])
+
+    def skip_target(self, i):
+        """Return the position the skip pointer at ``i`` jumps to, or -1 if there is none."""
+        if self.skip_length and i % self.skip_length == 0 and i + self.skip_length < self.length:
+            return i + self.skip_length
+        return -1
 
     def traverse_list(self):
-        result = []
-        current = self.start_node
-        while current:
-            result.append(current.value)
-            current = current.next
-        return result
+        self.sort()
+        return self.doc_ids.tolist()
 
     def traverse_skips(self):
+        self.sort()
         result = []
-        current = self.start_node
-        while current:
-            result.append(current.value)
-            if current.skip:
-                current = current.skip
-            else:
-                current = current.next
+        i = 0
+        while i < self.length:
+            result.append(self.doc_ids[i])
+            skip = self.skip_target(i)
+            i = skip if skip != -1 else i + 1
         return result
 
     def add_skip_connections(self):
+        self.sort()
         if self.length <= 2:
             return
-            
+
         n_skips = math.floor(math.sqrt(self.length))
- 
         skip_length = math.floor(self.length / (n_skips + 1))
-        
-        current = self.start_node
-        for i in range(self.length):
-            if i % skip_length == 0 and i + skip_length < self.length:
-                skip_to = current
-                steps = skip_length
-                while steps > 0 and skip_to:
-                    skip_to = skip_to.next
-                    steps -= 1
-                if skip_to:
-                    current.skip = skip_to
-            current = current.next
 
         self.n_skips = n_skips
         self.skip_length = skip_length
 
-    def insert_at_end(self, value):
-        new_node = Node(value)
-        if self.start_node is None:
-            self.start_node = self.end_node = new_node
-        else:
-            current = self.start_node
-            prev = None
-            while current and current.value < value:
-                prev = current
-                current = current.next
-            if prev is None:
-                new_node.next = self.start_node
-                self.start_node = new_node
-            else:
-                new_node.next = current
-                prev.next = new_node
-            if new_node.next is None:
-                self.end_node = new_node
-        self.length += 1
-
     def to_list(self):
-        result = []
-        current = self.start_node
-        while current:
-            result.append(current.value)
-            current = current.next
-        return result
+        return self.traverse_list()
+
+
+# Kept so code written against the old linked-list postings keeps importing.
+LinkedList = PostingsList
 
 # Indexer Code
 
 class Indexer:
-    def __init__(self):
+    def __init__(self, positional=False):
+        self.positional = positional
         self.inverted_index = OrderedDict({})
         self.doc_count = 0
+        self.doc_lengths = {}
+        self.total_doc_length = 0
 
     def get_index(self):
         return self.inverted_index
 
+    def get_postings(self, term):
+        postings = self.inverted_index.get(term)
+        return postings if postings is not None else PostingsList()
+
+    def doc_length(self, doc_id):
+        return self.doc_lengths.get(doc_id, 0)
+
+    @property
+    def avg_doc_length(self):
+        return self.total_doc_length / self.doc_count if self.doc_count else 0.0
+
     def generate_inverted_index(self, doc_id, tokenized_document):
-        for t in tokenized_document:
-            self.add_to_index(t, doc_id)
+        if self.positional:
+            positions = {}
+            for position, t in enumerate(tokenized_document):
+                positions.setdefault(t, []).append(position)
+            for t, term_positions in positions.items():
+                self.add_to_index(t, doc_id, len(term_positions), encode_positions(term_positions))
+        else:
+            for t, tf in Counter(tokenized_document).items():
+                self.add_to_index(t, doc_id, tf)
+        self.doc_lengths[doc_id] = len(tokenized_document)
+        self.total_doc_length += len(tokenized_document)
         self.doc_count += 1
 
-    def add_to_index(self, term_, doc_id_):
+    def add_to_index(self, term_, doc_id_, tf_=1, positions_=None):
         if term_ not in self.inverted_index:
-            self.inverted_index[term_] = LinkedList()
-        self.inverted_index[term_].insert_at_end(doc_id_)
+            self.inverted_index[term_] = PostingsList()
+        self.inverted_index[term_].insert_at_end(doc_id_, tf_, positions_)
+
+    @classmethod
+    def merge_blocks(cls, blocks):
+        """
+        Merge partial indexes built over consecutive runs of documents.
+
+        Every block must have had ``sort_terms`` called on it. Terms are merged
+        in order across blocks, SPIMI style, and each term's postings are
+        concatenated in block order, so the result is the same as indexing all
+        the documents into a single ``Indexer`` in that order.
+        """
+        merged = cls(positional=any(block.positional for block in blocks))
+        terms = heapq.merge(*(block.inverted_index.items() for block in blocks), key=itemgetter(0))
+        for term, group in groupby(terms, key=itemgetter(0)):
+            postings = PostingsList()
+            for _, block_postings in group:
+                postings.extend(block_postings)
+            postings.sort()
+            merged.inverted_index[term] = postings
+        for block in blocks:
+            merged.doc_lengths.update(block.doc_lengths)
+            merged.total_doc_length += block.total_doc_length
+            merged.doc_count += block.doc_count
+        return merged
 
     def sort_terms(self):
         sorted_index = OrderedDict({})
         for k in sorted(self.inverted_index.keys()):
+            self.inverted_index[k].sort()
             sorted_index[k] = self.inverted_index[k]
         self.inverted_index = sorted_index
 
@@ -147,9 +232,10 @@ class Indexer:
             postings_list = self.inverted_index[term]
             df = postings_list.length
             idf = math.log10(self.doc_count / df)
-            
-            current = postings_list.start_node
-            while current:
-                tf = 1
-                current.score = tf * idf
-                current = current.next
+            postings_list.idf = idf
+
+            postings_list.sort()
+            postings_list.scores = array('d', [
+                tf / self.doc_lengths[doc_id] * idf
+                for doc_id, tf in zip(postings_list.doc_ids, postings_list.tfs)
+            ])
@@ -0,0 +1,177 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Query Cache Code
+#
+# Retrieval results (ranked doc ids, answers and the generated summary) are
+# cached under the query's normalised tokens, the topic it was searched in and
+# the retrieval mode, so rephrasings that tokenise the same way share an
+# entry. Entries expire after a TTL, the least recently used entry is evicted
+# once the cache is full, and everything is dropped when the fingerprint of
+# the data the results were computed from changes.
+#
+# With a ``path``, entries are also written to a SQLite table there, so
+# separate processes (the Streamlit app and terminal_app.py) answer from each
+# other's results: a miss in memory is looked up in the table before it
+# counts as a miss. Values must then be JSON-serialisable, and table entries
+# expire by wall-clock time.
+
+
+class QueryCache:
+    """Thread-safe LRU cache with per-entry TTLs and fingerprint invalidation, optionally shared through SQLite."""
+
+    def __init__(self, max_entries=1024, ttl=3600, clock=time.monotonic, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.path = path
+        self.fingerprint = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(tokens, topics, mode):
+        """Cache key for a query's normalised tokens; a list of topics is order-insensitive."""
+        if topics is not None and not isinstance(topics, str):
+            topics = tuple(sorted(set(topics)))
+            if len(topics) == 1:
+                topics = topics[0]
+        return tuple(tokens), topics, mode
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self.fingerprint:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.fingerprint = fingerprint
+
+    def get(self, key, fingerprint):
+        """The value cached under ``key``, or None if it is missing, expired or from other data."""
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None and self.path is not None:
+                entry = self._load(key, fingerprint)
+                if entry is not None:
+                    self._entries[key] = entry
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, fingerprint, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            if self.path is not None:
+                self._store(key, value, fingerprint, ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.path is not None:
+                conn = self._connect()
+                try:
+                    conn.execute("DELETE FROM query_cache")
+                    conn.commit()
+                finally:
+                    conn.close()
+
+    # Shared table
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS query_cache (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT,
+                    value TEXT,
+                    expires REAL,
+                    last_used REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS query_cache_last_used ON query_cache (last_used)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _load(self, key, fingerprint):
+        """The in-memory entry for ``key`` from the shared table, or None."""
+        conn = self._connect()
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT value, expires FROM query_cache WHERE key = ? AND fingerprint = ?",
+                (json.dumps(key), json.dumps(fingerprint)),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM query_cache WHERE key = ?", (json.dumps(key),))
+                conn.commit()
+                self.expirations += 1
+                return None
+            conn.execute("UPDATE query_cache SET last_used = ? WHERE key = ?", (now, json.dumps(key)))
+            conn.commit()
+            # Keep the time left, measured on this cache's clock.
+            return self.clock() + row[1] - now, json.loads(row[0])
+        finally:
+            conn.close()
+
+    def _store(self, key, value, fingerprint, ttl):
+        conn = self._connect()
+        try:
+            now = time.time()
+            fingerprint = json.dumps(fingerprint)
+            # Entries computed from other data can never be served again.
+            conn.execute("DELETE FROM query_cache WHERE fingerprint != ?", (fingerprint,))
+            conn.execute("""
+                INSERT INTO query_cache (key, fingerprint, value, expires, last_used) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    fingerprint = excluded.fingerprint, value = excluded.value,
+                    expires = excluded.expires, last_used = excluded.last_used
+            """, (json.dumps(key), fingerprint, json.dumps(value), now + ttl, now))
+            conn.execute("""
+                DELETE FROM query_cache WHERE key IN (
+                    SELECT key FROM query_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
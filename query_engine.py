@@ -0,0 +1,298 @@
+import heapq
+import sqlite3
+from bisect import bisect_left
+from preprocess_index import Preprocessor, PostingsList
+from binary_index import load_index
+
+# Boolean Query Engine Code
+
+
+class QueryStats:
+    """Counters accumulated over every query an engine has run."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.comparisons = 0
+        self.skips = 0
+        self.blocks_decoded = 0
+
+    def as_dict(self):
+        return {
+            "queries": self.queries,
+            "comparisons": self.comparisons,
+            "skips": self.skips,
+            "blocks_decoded": self.blocks_decoded,
+            "comparisons_per_query": self.comparisons / self.queries if self.queries else 0.0,
+            "skips_per_query": self.skips / self.queries if self.queries else 0.0,
+        }
+
+
+class BooleanQueryEngine:
+    """
+    Document-at-a-time AND/OR queries over an ``Indexer`` or ``BinaryIndexReader``.
+
+    Postings lists are merged pairwise in ascending document frequency order.
+    Intersections follow skip pointers whenever the skip target does not pass
+    the doc id on the other list, and the intermediate result gets its own
+    skips so later merges can use them too. Matching documents are ranked by
+    the sum of their tf-idf posting scores.
+
+    Over a positional index, phrase and proximity queries intersect the
+    documents first and then the terms' position lists within each match.
+    """
+
+    def __init__(self, index, preprocessor=None):
+        self.index = index
+        self.preprocessor = preprocessor or Preprocessor()
+        self.stats = QueryStats()
+
+    def _postings_by_term(self, query_tokens):
+        postings = {term: self.index.get_postings(term) for term in dict.fromkeys(query_tokens)}
+        for postings_list in postings.values():
+            postings_list.sort()
+        return postings
+
+    def _postings_by_df(self, query_tokens):
+        return sorted(self._postings_by_term(query_tokens).values(), key=lambda p: p.length)
+
+    def _advance(self, postings, i, target):
+        """Follow skips from ``i`` while they do not pass ``target``, else step once."""
+        skip = postings.skip_target(i)
+        if skip == -1:
+            return i + 1
+        self.stats.comparisons += 1
+        if postings.doc_ids[skip] > target:
+            return i + 1
+        while skip != -1 and postings.doc_ids[skip] <= target:
+            self.stats.skips += 1
+            i = skip
+            skip = postings.skip_target(i)
+            if skip != -1:
+                self.stats.comparisons += 1
+        return i
+
+    def _intersect(self, p1, p2):
+        result = PostingsList()
+        i = j = 0
+        while i < p1.length and j < p2.length:
+            x, y = p1.doc_ids[i], p2.doc_ids[j]
+            self.stats.comparisons += 1
+            if x == y:
+                result.insert_at_end(x)
+                result.scores[-1] = p1.scores[i] + p2.scores[j]
+                i += 1
+                j += 1
+            elif x < y:
+                i = self._advance(p1, i, y)
+            else:
+                j = self._advance(p2, j, x)
+        result.add_skip_connections()
+        return result
+
+    def _union(self, p1, p2):
+        result = PostingsList()
+        i = j = 0
+        while i < p1.length or j < p2.length:
+            if i < p1.length and j < p2.length:
+                self.stats.comparisons += 1
+            if j == p2.length or (i < p1.length and p1.doc_ids[i] < p2.doc_ids[j]):
+                result.insert_at_end(p1.doc_ids[i])
+                result.scores[-1] = p1.scores[i]
+                i += 1
+            elif i == p1.length or p2.doc_ids[j] < p1.doc_ids[i]:
+                result.insert_at_end(p2.doc_ids[j])
+                result.scores[-1] = p2.scores[j]
+                j += 1
+            else:
+                result.insert_at_end(p1.doc_ids[i])
+                result.scores[-1] = p1.scores[i] + p2.scores[j]
+                i += 1
+                j += 1
+        return result
+
+    def _intersect_all(self, postings):
+        postings = sorted(postings, key=lambda p: p.length)
+        if not postings:
+            return PostingsList()
+        result = postings[0]
+        for postings_list in postings[1:]:
+            if not result.length:
+                break
+            result = self._intersect(result, postings_list)
+        return result
+
+    def intersect(self, query_tokens):
+        """Postings of the documents that contain every query term."""
+        self.stats.queries += 1
+        return self._intersect_all(self._postings_by_df(query_tokens))
+
+    def intersect_blocks(self, query_tokens):
+        """
+        Doc ids containing every query term, read through compressed-block cursors.
+
+        Cursors leapfrog each other with ``next_geq``, so only the blocks that
+        may hold a common doc id are decoded. Needs a ``BinaryIndexReader``
+        written with a compressed codec.
+        """
+        self.stats.queries += 1
+        terms = sorted(dict.fromkeys(query_tokens), key=self.index.df)
+        cursors = [self.index.block_cursor(term) for term in terms]
+        if not cursors or None in cursors:
+            return []
+
+        result = []
+        doc_id = cursors[0].next_geq(0)
+        while doc_id is not None:
+            for cursor in cursors[1:]:
+                self.stats.comparisons += 1
+                found = cursor.next_geq(doc_id)
+                if found is None:
+                    doc_id = None
+                    break
+                if found != doc_id:
+                    doc_id = cursors[0].next_geq(found)
+                    break
+            else:
+                result.append(doc_id)
+                doc_id = cursors[0].next_geq(doc_id + 1)
+        self.stats.blocks_decoded += sum(cursor.blocks_decoded for cursor in cursors)
+        return result
+
+    def union(self, query_tokens):
+        """Postings of the documents that contain any query term."""
+        self.stats.queries += 1
+        result = PostingsList()
+        for postings_list in self._postings_by_df(query_tokens):
+            result = self._union(result, postings_list)
+        return result
+
+    @staticmethod
+    def rank(postings, k=None):
+        ranked = sorted(zip(postings.scores, postings.doc_ids), key=lambda r: (-r[0], r[1]))
+        if k is not None:
+            ranked = ranked[:k]
+        return [{"doc_id": doc_id, "relevance": score} for score, doc_id in ranked]
+
+    def and_query(self, query, k=None):
+        """Rank the documents matching every term of a raw query string."""
+        return self.rank(self.intersect(self.preprocessor.tokenizer(query)), k)
+
+    def or_query(self, query, k=None):
+        """Rank the documents matching any term of a raw query string."""
+        return self.rank(self.union(self.preprocessor.tokenizer(query)), k)
+
+    # Positional queries
+
+    @staticmethod
+    def _positions(postings, doc_id):
+        return postings.positions_at(bisect_left(postings.doc_ids, doc_id))
+
+    @staticmethod
+    def phrase_starts(position_lists):
+        """Positions where the lists' terms occur one right after the other, in list order."""
+        starts = position_lists[0]
+        for offset, positions in enumerate(position_lists[1:], 1):
+            matched = []
+            i = j = 0
+            while i < len(starts) and j < len(positions):
+                target = positions[j] - offset
+                if starts[i] == target:
+                    matched.append(target)
+                    i += 1
+                    j += 1
+                elif starts[i] < target:
+                    i += 1
+                else:
+                    j += 1
+            starts = matched
+            if not starts:
+                break
+        return starts
+
+    @staticmethod
+    def min_span(position_lists):
+        """Length of the shortest window that holds at least one position from every list."""
+        heap = [(positions[0], n, 0) for n, positions in enumerate(position_lists)]
+        heapq.heapify(heap)
+        highest = max(positions[0] for positions in position_lists)
+        best = highest - heap[0][0] + 1
+        while True:
+            lowest, n, i = heapq.heappop(heap)
+            best = min(best, highest - lowest + 1)
+            if i + 1 == len(position_lists[n]):
+                return best
+            following = position_lists[n][i + 1]
+            highest = max(highest, following)
+            heapq.heappush(heap, (following, n, i + 1))
+
+    def _matching_positions(self, query_tokens):
+        """Yield (doc_id, score, per-token position lists) for documents holding every token."""
+        postings = self._postings_by_term(query_tokens)
+        self.stats.queries += 1
+        candidates = self._intersect_all(postings.values())
+        for doc_id, score in zip(candidates.doc_ids, candidates.scores):
+            yield doc_id, score, [self._positions(postings[term], doc_id) for term in query_tokens]
+
+    def phrase_query(self, query, k=None):
+        """
+        Rank the documents containing a raw query string as an exact phrase.
+
+        Documents are ordered by how often the phrase occurs, then by tf-idf.
+        Positions count tokens left after stopword removal, as in the index.
+        """
+        query_tokens = self.preprocessor.tokenizer(query)
+        if not query_tokens:
+            return []
+        results = []
+        for doc_id, score, position_lists in self._matching_positions(query_tokens):
+            matches = len(self.phrase_starts(position_lists))
+            if matches:
+                results.append({"doc_id": doc_id, "relevance": score, "phrase_matches": matches})
+        results.sort(key=lambda r: (-r["phrase_matches"], -r["relevance"], r["doc_id"]))
+        return results[:k] if k is not None else results
+
+    def proximity_query(self, query, window=10, k=None):
+        """
+        Rank the documents holding every query term, favouring terms that appear close together.
+
+        A document whose terms all fit in ``window`` consecutive tokens has its
+        tf-idf score boosted by the number of distinct terms over the span they
+        occupy, so tight matches rank above scattered bag-of-words matches.
+        """
+        query_tokens = list(dict.fromkeys(self.preprocessor.tokenizer(query)))
+        if not query_tokens:
+            return []
+        results = []
+        for doc_id, score, position_lists in self._matching_positions(query_tokens):
+            span = self.min_span(position_lists)
+            if span <= window:
+                score *= 1 + len(query_tokens) / span
+            results.append({"doc_id": doc_id, "relevance": score, "span": span})
+        results.sort(key=lambda r: (-r["relevance"], r["doc_id"]))
+        return results[:k] if k is not None else results
+
+
+def load_query_log(db_path='chatbot.db'):
+    """User messages logged by app.py, oldest first."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT message FROM chat_messages WHERE role = 'user' ORDER BY timestamp ASC")
+    queries = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return queries
+
+
+if __name__ == "__main__":
+    # Replay the logged user queries to see how much the skip pointers save.
+    engine = BooleanQueryEngine(load_index('data/inverted_index'))
+    for query in load_query_log():
+        engine.and_query(query)
+    print(f"AND: {engine.stats.as_dict()}")
+
+    engine.stats.reset()
+    for query in load_query_log():
+        engine.or_query(query)
+    print(f"OR:  {engine.stats.as_dict()}")
@@ -0,0 +1,325 @@
+import os
+import json
+import math
+import heapq
+import threading
+from array import array
+from itertools import groupby
+from operator import itemgetter
+from preprocess_index import Preprocessor, Indexer, PostingsList
+from document_stream import iter_documents
+from binary_index import BinaryIndexReader, BinaryIndexWriter, write_indexer, LEXICON_SUFFIX, POSTINGS_SUFFIX, DOCS_SUFFIX
+
+# Segmented Index Code
+#
+# The index directory holds a manifest.json and any number of immutable
+# segments, each a binary index (see binary_index.py). Added documents are
+# written as a new segment, deleted ones are recorded as tombstones against
+# the segments that hold them, and a merge policy folds small segments
+# together, dropping tombstoned documents, in a background thread. Queries
+# read every live segment and rescore postings with corpus-wide statistics,
+# so doc counts and IDF reflect the current set of live documents.
+
+MANIFEST_FILE = 'manifest.json'
+
+
+class Segment:
+    __slots__ = ('name', 'reader', 'deleted', 'deleted_length')
+
+    def __init__(self, name, reader, deleted=()):
+        self.name = name
+        self.reader = reader
+        self.deleted = set(deleted)
+        self.deleted_length = sum(reader.doc_length(doc_id) for doc_id in self.deleted)
+
+    @property
+    def live_count(self):
+        return self.reader.doc_count - len(self.deleted)
+
+    @property
+    def live_length(self):
+        return self.reader.total_doc_length - self.deleted_length
+
+    def is_live(self, doc_id):
+        return doc_id not in self.deleted and self.reader.has_doc(doc_id)
+
+    def delete(self, doc_id):
+        if self.is_live(doc_id):
+            self.deleted.add(doc_id)
+            self.deleted_length += self.reader.doc_length(doc_id)
+            return True
+        return False
+
+
+class SegmentedIndex:
+    """
+    Inverted index that takes additions and deletions keyed by ``revision_id``.
+
+    Exposes the same ``get_postings`` / ``doc_count`` / ``doc_length`` /
+    ``avg_doc_length`` interface as ``Indexer`` and ``BinaryIndexReader``, so
+    ``BM25Scorer`` and ``BooleanQueryEngine`` can query it directly.
+    """
+
+    def __init__(self, directory, max_segments=8, merge_factor=4, background_merge=True, positional=False, codec='vbyte', preprocessor=None):
+        self.directory = str(directory)
+        self.positional = positional
+        self.codec = codec
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+        self.background_merge = background_merge
+        self.preprocessor = preprocessor or Preprocessor()
+        self._lock = threading.RLock()
+        self._merge_thread = None
+        self._segments = []
+        self._generation = 0
+        # Bumped whenever the live documents change, so scorers know to drop per-term statistics.
+        self.version = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as file:
+                manifest = json.load(file)
+            self._generation = manifest['generation']
+            for entry in manifest['segments']:
+                reader = BinaryIndexReader(self._prefix(entry['name']))
+                self._segments.append(Segment(entry['name'], reader, entry['deleted']))
+
+    def _prefix(self, name):
+        return os.path.join(self.directory, name)
+
+    def _next_segment_name(self):
+        self._generation += 1
+        return f"segment_{self._generation:06d}"
+
+    def _write_manifest(self):
+        manifest = {
+            "generation": self._generation,
+            "segments": [{"name": s.name, "deleted": sorted(s.deleted)} for s in self._segments],
+        }
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w') as file:
+            json.dump(manifest, file)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._segments)
+
+    # Updates
+
+    def add_documents(self, documents):
+        """
+        Index scraped documents into a new segment.
+
+        A document whose ``revision_id`` is already live replaces the older copy,
+        as does a later document with the same ``revision_id`` in the same batch.
+        """
+        latest = {doc['revision_id']: doc for doc in documents}
+        if not latest:
+            return
+        indexer = Indexer(positional=self.positional)
+        for revision_id, doc in latest.items():
+            text = f"{doc['title']} {doc['summary']}"
+            indexer.generate_inverted_index(revision_id, self.preprocessor.tokenizer(text))
+        indexer.sort_terms()
+        indexer.calculate_tf_idf()
+
+        with self._lock:
+            name = self._next_segment_name()
+            write_indexer(indexer, self._prefix(name), codec=self.codec)
+            for segment in self._segments:
+                for revision_id in latest:
+                    segment.delete(revision_id)
+            self._segments.append(Segment(name, BinaryIndexReader(self._prefix(name))))
+            self.version += 1
+            self._write_manifest()
+        self.maybe_merge()
+
+    def delete_documents(self, revision_ids):
+        """Tombstone documents by ``revision_id``. Returns how many live documents were deleted."""
+        deleted = 0
+        with self._lock:
+            for revision_id in revision_ids:
+                deleted += sum(segment.delete(revision_id) for segment in self._segments)
+            if deleted:
+                self.version += 1
+                self._write_manifest()
+        return deleted
+
+    def live_doc_ids(self):
+        doc_ids = set()
+        for segment in self._snapshot():
+            doc_ids.update(doc_id for doc_id, _ in segment.reader.doc_lengths() if doc_id not in segment.deleted)
+        return doc_ids
+
+    def sync(self, documents):
+        """
+        Bring the index in line with a fresh scrape without rebuilding it.
+
+        Documents with a ``revision_id`` that is not indexed yet are added, and
+        indexed revisions missing from ``documents`` are deleted.
+        """
+        documents = list(documents)
+        live = self.live_doc_ids()
+        current = {doc['revision_id'] for doc in documents}
+        self.add_documents([doc for doc in documents if doc['revision_id'] not in live])
+        return self.delete_documents(live - current)
+
+    # Merging
+
+    def maybe_merge(self):
+        """Start merging if there are more than ``max_segments`` segments."""
+        with self._lock:
+            if len(self._segments) <= self.max_segments:
+                return
+            if not self.background_merge:
+                self._merge_until_within_limit()
+            elif self._merge_thread is None or not self._merge_thread.is_alive():
+                self._merge_thread = threading.Thread(target=self._merge_until_within_limit, daemon=True)
+                self._merge_thread.start()
+
+    def _merge_until_within_limit(self):
+        while True:
+            with self._lock:
+                if len(self._segments) <= self.max_segments:
+                    return
+                # Merge the smallest segments first, so large ones are rewritten rarely.
+                smallest = sorted(self._segments, key=lambda s: s.live_count)[:self.merge_factor]
+            self.merge_segments([segment.name for segment in smallest])
+
+    def wait_for_merges(self):
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join()
+
+    def merge_segments(self, names):
+        """Rewrite the named segments as one, dropping their tombstoned documents."""
+        with self._lock:
+            segments = [s for s in self._segments if s.name in names]
+            if len(segments) < 2:
+                return
+            deleted_at_start = {s.name: set(s.deleted) for s in segments}
+            name = self._next_segment_name()
+
+        doc_lengths = {}
+        for segment in segments:
+            deleted = deleted_at_start[segment.name]
+            doc_lengths.update((doc_id, length) for doc_id, length in segment.reader.doc_lengths() if doc_id not in deleted)
+        doc_count = len(doc_lengths)
+
+        # Each segment's terms are already sorted, so they can be merged without building a full index in memory.
+        terms = heapq.merge(*(self._segment_terms(segment) for segment in segments), key=itemgetter(0))
+        positional = all(segment.reader.positional for segment in segments)
+        with BinaryIndexWriter(self._prefix(name), doc_lengths, positional=positional, codec=self.codec) as writer:
+            for term, group in groupby(terms, key=itemgetter(0)):
+                postings = PostingsList()
+                for _, segment in group:
+                    postings.extend(self._live_postings(segment, term, deleted_at_start[segment.name]))
+                if not postings.length:
+                    continue
+                postings.sort()
+                idf = math.log10(doc_count / postings.length)
+                scores = [tf / doc_lengths[doc_id] * idf for doc_id, tf in zip(postings.doc_ids, postings.tfs)]
+                writer.add_term(term, postings.doc_ids, postings.tfs, scores, postings.positions if positional else None)
+
+        with self._lock:
+            merged = Segment(name, BinaryIndexReader(self._prefix(name)))
+            # Carry over deletions that arrived while the merge was running.
+            for segment in segments:
+                for doc_id in segment.deleted - deleted_at_start[segment.name]:
+                    merged.delete(doc_id)
+            position = self._segments.index(segments[0])
+            self._segments = [s for s in self._segments if s not in segments]
+            self._segments.insert(min(position, len(self._segments)), merged)
+            self.version += 1
+            self._write_manifest()
+
+        # Queries that took a snapshot before the swap may still be reading the old
+        # segments; their maps stay valid after unlinking and are freed with the readers.
+        for segment in segments:
+            for suffix in (LEXICON_SUFFIX, POSTINGS_SUFFIX, DOCS_SUFFIX):
+                try:
+                    os.remove(self._prefix(segment.name) + suffix)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _segment_terms(segment):
+        for term in segment.reader.terms():
+            yield term, segment
+
+    @staticmethod
+    def _live_postings(segment, term, deleted):
+        postings = segment.reader.get_postings(term)
+        if not deleted:
+            return postings
+        live = PostingsList()
+        for i, (doc_id, tf) in enumerate(zip(postings.doc_ids, postings.tfs)):
+            if doc_id not in deleted:
+                live.insert_at_end(doc_id, tf, postings.positions[i] if postings.positions is not None else None)
+        return live
+
+    # Queries
+
+    @property
+    def doc_count(self):
+        return sum(segment.live_count for segment in self._snapshot())
+
+    @property
+    def total_doc_length(self):
+        return sum(segment.live_length for segment in self._snapshot())
+
+    @property
+    def avg_doc_length(self):
+        doc_count = self.doc_count
+        return self.total_doc_length / doc_count if doc_count else 0.0
+
+    def has_doc(self, doc_id):
+        return any(segment.is_live(doc_id) for segment in self._snapshot())
+
+    def doc_length(self, doc_id):
+        for segment in self._snapshot():
+            if segment.is_live(doc_id):
+                return segment.reader.doc_length(doc_id)
+        return 0
+
+    def get_postings(self, term):
+        """Live postings for ``term`` across all segments, scored with corpus-wide IDF."""
+        segments = self._snapshot()
+        postings = PostingsList()
+        lengths = {}
+        for segment in segments:
+            live = self._live_postings(segment, term, segment.deleted)
+            for doc_id in live.doc_ids:
+                lengths[doc_id] = segment.reader.doc_length(doc_id)
+            postings.extend(live)
+        if not postings.length:
+            return postings
+
+        postings.sort()
+        doc_count = sum(segment.live_count for segment in segments)
+        postings.idf = math.log10(doc_count / postings.length)
+        postings.scores = array('d', [
+            tf / lengths[doc_id] * postings.idf
+            for doc_id, tf in zip(postings.doc_ids, postings.tfs)
+        ])
+        postings.add_skip_connections()
+        return postings
+
+    def close(self):
+        self.wait_for_merges()
+        with self._lock:
+            for segment in self._segments:
+                segment.reader.close()
+            self._segments = []
+
+
+if __name__ == "__main__":
+    json_file_path = 'data/scraped_data.json'
+    index_directory = 'data/segments'
+
+    index = SegmentedIndex(index_directory)
+    deleted = index.sync(doc for _, doc in iter_documents(json_file_path))
+    index.close()
+    print(f"Segmented index in {index_directory} synced, {deleted} stale revisions deleted.")
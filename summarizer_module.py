@@ -1,31 +1,49 @@
-import streamlit as st
-from google import genai
+from llm_backend import get_backend
+from summary_cache import summary_cache, prompt_key
 
-def generate_summary_with_gemini(summaries):
+def generate_summary_with_gemini(summaries, cache_key=None):
     """
     Generate a cohesive summary from multiple summaries using Google Gemini.
 
     Args:
         summaries (list of str): List of document summaries.
+        cache_key (tuple): What the summaries were built from, e.g. the
+            normalised query and ordered doc ids.
+            With a key, the persistent summary cache is consulted first.
 
     Returns:
         str: The final summarized text.
     """
-    # Configure API key
-    client = genai.Client(api_key=st.secrets["GEMINI_API_KEY"])
+    # Call the Gemini API through the shared backend, unless the summary is cached
+    return summary_cache.generate(
+        _cache_key(cache_key), lambda: get_backend().generate(summary_input(summaries))
+    )
 
-    # Construct the prompt using summaries
-    combined_input = "Summarize the following information concisely within 300 tokens:\n"
-    for i, summary in enumerate(summaries, 1):
-        combined_input += f"{i}. {summary}\n"
+def stream_summary_with_gemini(summaries, cache_key=None):
+    """
+    Stream a cohesive summary from multiple summaries using Google Gemini.
 
-    # Call the Gemini API
-    response = client.models.generate_content(
-        model = "gemini-2.0-flash-lite", contents= combined_input
+    Args:
+        summaries (list of str): List of document summaries.
+        cache_key (tuple): As for ``generate_summary_with_gemini``.
+
+    Yields:
+        str: Chunks of the summarized text as they arrive; a cached summary
+        arrives as one chunk.
+    """
+    return summary_cache.stream(
+        _cache_key(cache_key), lambda: get_backend().generate_stream(summary_input(summaries))
     )
 
-    # Extract and return the summarized text
-    return response.text.strip() if hasattr(response, "text") else response.candidates[0].content.strip()
+def _cache_key(cache_key):
+    return None if cache_key is None else prompt_key("summary", *cache_key)
+
+def summary_input(summaries):
+    """Construct the prompt using summaries."""
+    combined_input = "Summarize the following information concisely within 300 tokens:\n"
+    for i, summary in enumerate(summaries, 1):
+        combined_input += f"{i}. {summary}\n"
+    return combined_input
 
 def summarize_documents(documents):
     """
@@ -0,0 +1,179 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Summary Cache Code
+#
+# Generated summaries and chit-chat replies are kept in a SQLite file next
+# to chatbot.db, so an identical question over identical documents is
+# answered without another Gemini call, across restarts. Entries are keyed
+# by a hash of the prompt template version, the normalised query and what
+# the prompt was built from (the ordered doc ids of the retrieved documents,
+# or the chat history), and the least recently used entries are evicted
+# once the cache holds more than ``max_entries``. Hit and miss counts are
+# stored in the same file, so the hit rate covers the cache's whole life.
+
+SUMMARY_CACHE_FILE = "summary_cache.db"
+WORD = re.compile(r"\w+")
+# Version of each cached prompt template. Bump one whenever its prompt changes,
+# so texts cached for the old prompt are not reused:
+#   summary  - summarizer_module.summary_input and wiki_qna_module.summary_prompt
+#   chitchat - ChitChatSystem.chitchat_prompt
+#   memory   - conversation_memory.summary_prompt
+PROMPT_VERSIONS = {"summary": 1, "chitchat": 1, "memory": 1}
+
+
+def normalize_query(query):
+    """Lowercased words of ``query``, so case, spacing and punctuation do not change the key."""
+    return " ".join(WORD.findall(query.lower()))
+
+
+def prompt_key(kind, *parts):
+    """Cache key of a text generated from a ``kind`` prompt built from ``parts``, at the prompt's current version."""
+    return SummaryCache.key(kind, PROMPT_VERSIONS[kind], *parts)
+
+
+class SummaryCache:
+    """Persistent LRU cache of generated texts, bounded by entry count."""
+
+    def __init__(self, path=SUMMARY_CACHE_FILE, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts):
+        """Hex SHA-256 of the JSON-encoded key parts."""
+        return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with self._lock:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS summaries (
+                        key TEXT PRIMARY KEY,
+                        text TEXT,
+                        created REAL,
+                        last_used REAL,
+                        hits INTEGER DEFAULT 0
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+                conn.execute("CREATE TABLE IF NOT EXISTS summary_cache_stats (name TEXT PRIMARY KEY, value INTEGER)")
+                conn.commit()
+                self._initialized = True
+        return conn
+
+    @staticmethod
+    def _count(conn, name, amount=1):
+        conn.execute("""
+            INSERT INTO summary_cache_stats (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """, (name, amount))
+
+    def get(self, key):
+        """The text cached under ``key``, or None."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT text FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(conn, "misses")
+            else:
+                conn.execute("UPDATE summaries SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+                self._count(conn, "hits")
+            conn.commit()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def put(self, key, text):
+        conn = self._connect()
+        try:
+            now = time.time()
+            conn.execute("""
+                INSERT INTO summaries (key, text, created, last_used) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET text = excluded.text, last_used = excluded.last_used
+            """, (key, text, now, now))
+            excess = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute("""
+                    DELETE FROM summaries WHERE key IN (
+                        SELECT key FROM summaries ORDER BY last_used LIMIT ?
+                    )
+                """, (excess,))
+                self._count(conn, "evictions", excess)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def generate(self, key, generate):
+        """The text cached under ``key``, or ``generate()``, cached under ``key``. A None key bypasses the cache."""
+        if key is not None:
+            text = self.get(key)
+            if text is not None:
+                return text
+        text = generate()
+        if key is not None and text:
+            self.put(key, text)
+        return text
+
+    def stream(self, key, stream):
+        """
+        Yield the text cached under ``key`` as one chunk, or the chunks of ``stream()``.
+
+        A streamed text is cached once the stream is exhausted; one that is
+        abandoned half way is not.
+        """
+        if key is not None:
+            text = self.get(key)
+            if text is not None:
+                yield text
+                return
+        chunks = []
+        for chunk in stream():
+            chunks.append(chunk)
+            yield chunk
+        text = "".join(chunks).strip()
+        if key is not None and text:
+            self.put(key, text)
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM summaries")
+            conn.execute("DELETE FROM summary_cache_stats")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __len__(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT name, value FROM summary_cache_stats").fetchall())
+            size = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        finally:
+            conn.close()
+        hits, misses = counts.get("hits", 0), counts.get("misses", 0)
+        return {
+            "size": size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": counts.get("evictions", 0),
+        }
+
+
+# Shared by the summarizer and the chit-chat system.
+summary_cache = SummaryCache()
@@ -1,37 +1,48 @@
-import json
+import time
 from pathlib import Path
-from chitchat_module import ChitChatSystem
+from chitchat_module import get_chitchat_system
 from classifier_module import classify_query
 from summarizer_module import summarize_documents
-from wiki_qna_module import fetch_relevant_documents
+from wiki_qna_module import retrieve, query_cache, warm_up
+from summary_cache import summary_cache
+from document_stream import DocumentStream
 
 # Paths to resources
 DATA_DIR = Path("data")
 MODEL_DIR = Path("model/topic_classifier_model.joblib")
 
 # Initialize the ChitChat system
-chit_chat_system = ChitChatSystem()
+chit_chat_system = get_chitchat_system()
 
 # Load required resources
 def load_resources():
     print("Loading resources...")
     try:
-        # Load inverted index and scraped data
-        with open(DATA_DIR / "inverted_index.json", "r") as idx_file:
-            inverted_index = json.load(idx_file)
-        with open(DATA_DIR / "scraped_data.json", "r") as data_file:
-            scraped_data = json.load(data_file)
+        # Load scraped data
+        scraped_data = DocumentStream(DATA_DIR / "scraped_data.json")
         print("Resources loaded successfully!")
-        return inverted_index, scraped_data
+        return scraped_data
     except Exception as e:
         print(f"Error loading resources: {e}")
-        return None, None
+        return None
+
+def print_stream(chunks):
+    """Print streamed chunks as they arrive; returns the text and the time the first chunk arrived."""
+    text = ""
+    first_token = None
+    for chunk in chunks:
+        if first_token is None:
+            first_token = time.perf_counter()
+        print(chunk, end="", flush=True)
+        text += chunk
+    print()
+    return text, first_token
 
 # Chatbot loop with continuation
 def chatbot_interface():
     # Load resources
-    inverted_index, scraped_data = load_resources()
-    if not inverted_index or not scraped_data:
+    scraped_data = load_resources()
+    if not scraped_data:
         print("Failed to load resources. Exiting.")
         return
 
@@ -44,6 +55,10 @@ def chatbot_interface():
     while True:
         user_query = input("You: ").strip()
         if user_query.lower() == "exit":
+            stats = query_cache.stats()
+            print(f"Query cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+            stats = summary_cache.stats()
+            print(f"Summary cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), {stats['size']} entries")
             print("Goodbye!")
             break
 
@@ -51,7 +66,8 @@ def chatbot_interface():
         chat_history.append({"role": "user", "content": user_query})
 
         try:
-            # Classify the query
+            # Classify the query, loading the QA system and building its hybrid-search matrix meanwhile
+            warm_up(user_query)
             query_topic = classify_query(user_query, MODEL_DIR)
         except Exception as e:
             response = f"Error classifying query: {e}"
@@ -59,39 +75,49 @@ def chatbot_interface():
             chat_history.append({"role": "assistant", "content": response})
             continue
 
+        # Responses are printed as they stream in; time to first token and total time are kept per message
+        start = time.perf_counter()
+        first_token = None
         if query_topic == "General":
             # Handle chit-chat
             try:
                 # Pass the properly formatted chat history to the chit-chat system
-                response = chit_chat_system.generate_chitchat_response(
+                print("Bot: ", end="", flush=True)
+                response, first_token = print_stream(chit_chat_system.stream_chitchat_response(
                     user_input=user_query,
                     chat_history=[msg["content"] for msg in chat_history if msg["role"] == "user"]
-                )
+                ))
             except Exception as e:
                 response = f"Error generating chit-chat response: {e}"
+                print(response)
         else:
             # Handle topic-specific queries
             try:
                 # Fetch relevant documents and answers
-                response, answers = fetch_relevant_documents(user_query, query_topic, inverted_index, scraped_data)
+                result = retrieve(user_query, query_topic, stream=True)
+                answers = result.answers
                 
-                # Check if a response was generated
-                if not response:
+                # Check if any documents were found
+                if not result.doc_ids:
                     response = (
                         "Sorry, I couldn't find any relevant information. "
                         "Please try refining your query or provide more specific details."
                     )
+                    print(f"Bot: {response}")
                 else:
                     # Beautify the response and format answers
+                    header = "Here are the most relevant details based on your query:\n\n"
+                    print(f"Bot: {header}", end="", flush=True)
+                    summary, first_token = print_stream(result.summary_stream)
                     formatted_answers = "\n\n".join([f"- {answer.strip()}" for answer in answers]) if answers else "No specific answers found."
-                    
-                    response = (
-                        "Here are the most relevant details based on your query:\n\n"
-                        f"{response.strip()}\n\n"
+                    footer = (
+                        "\n"
                         "Details from the sources:\n"
                         f"{formatted_answers}\n\n"
                         "If you need more information, feel free to ask!"
                     )
+                    print(footer)
+                    response = f"{header}{summary.strip()}\n{footer}"
 
             except Exception as e:
                 # Handle and format exceptions gracefully
@@ -101,10 +127,16 @@ def chatbot_interface():
                     f"{str(e)}\n\n"
                     "Please check your query and try again."
                 )
+                print(f"Bot: {response}")
 
-            # Add bot's response to the chat history and display it
-        print(f"Bot: {response}")
-        chat_history.append({"role": "assistant", "content": response})
+        # Add bot's response to the chat history
+        end = time.perf_counter()
+        chat_history.append({
+            "role": "assistant",
+            "content": response,
+            "ttft_ms": round(((first_token or end) - start) * 1000, 3),
+            "total_ms": round((end - start) * 1000, 3),
+        })
 
 if __name__ == "__main__":
     chatbot_interface()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Stopwords for Preprocessor, from the copy shipped in data/ when NLTK has none installed.
+os.environ.setdefault("NLTK_DATA", os.path.join(ROOT, "data", "nltk_data"))
@@ -0,0 +1,25 @@
+from bm25_scorer import BM25Scorer
+from segment_index import SegmentedIndex
+
+
+def document(revision_id, summary):
+    return {"revision_id": revision_id, "title": "", "summary": summary}
+
+
+def test_reused_scorer_sees_segment_updates(tmp_path):
+    documents = [document(i, "zebra " + "filler words here " * (1 + i % 5)) for i in range(1, 28)]
+    documents += [document(i, "other animals " * (1 + i % 3)) for i in range(28, 40)]
+    index = SegmentedIndex(tmp_path, background_merge=False)
+    index.add_documents(documents)
+    scorer = BM25Scorer(index)
+    assert scorer.search("zebra", k=1)
+
+    # Deleting most zebra documents and adding a short one raises the term's
+    # best possible score; bounds cached before the update would prune it.
+    index.delete_documents(range(2, 28))
+    index.add_documents([document(500, "zebra zebra zebra")])
+
+    fresh = BM25Scorer(index)
+    assert scorer.search("zebra", k=3) == fresh.search("zebra", k=3)
+    assert scorer.search("zebra", k=1)[0]["doc_id"] == 500
+    index.close()
@@ -0,0 +1,103 @@
+import json
+import random
+
+import pytest
+
+from binary_index import BinaryIndexReader, BinaryIndexWriter
+from document_stream import iter_grouped_json
+from postings_codec import BLOCK_SIZE, CODECS, encode_positions, decode_positions
+from query_engine import BooleanQueryEngine
+
+
+def random_postings(rng, n_docs, df):
+    doc_ids = sorted(rng.sample(range(n_docs), df))
+    tfs = [rng.randint(1, 5) for _ in doc_ids]
+    scores = [rng.random() for _ in doc_ids]
+    positions = [encode_positions(sorted(rng.sample(range(200), tf))) for tf in tfs]
+    return doc_ids, tfs, scores, positions
+
+
+def write_index(prefix, terms, doc_lengths, codec):
+    with BinaryIndexWriter(prefix, doc_lengths, positional=True, codec=codec) as writer:
+        for term in sorted(terms):
+            writer.add_term(term, *terms[term])
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_binary_index_round_trip(tmp_path, codec):
+    rng = random.Random(0)
+    n_docs = 5000
+    # Lists shorter than, exactly one and several blocks long, with gaps of every width.
+    dfs = {"a": 1, "b": 7, "c": BLOCK_SIZE, "d": BLOCK_SIZE + 1, "e": 3 * BLOCK_SIZE + 5, "f": 2000, "ü": 40}
+    terms = {term: random_postings(rng, n_docs, df) for term, df in dfs.items()}
+    terms["g"] = ([0, 1, 2, 10**12], [1, 1, 1, 1], [0.5] * 4, [encode_positions([0])] * 4)
+    doc_lengths = {doc_id: rng.randint(1, 300) for doc_id in range(n_docs)}
+    doc_lengths[10**12] = 3
+    write_index(tmp_path / "index", terms, doc_lengths, codec)
+
+    reader = BinaryIndexReader(tmp_path / "index")
+    try:
+        assert reader.codec == codec
+        assert reader.doc_count == len(doc_lengths)
+        assert list(reader.terms()) == sorted(terms)
+        for term, (doc_ids, tfs, scores, positions) in terms.items():
+            postings = reader.get_postings(term)
+            assert list(postings.doc_ids) == doc_ids
+            assert list(postings.tfs) == tfs
+            assert list(postings.scores) == scores
+            assert [decode_positions(p) for p in postings.positions] == [decode_positions(p) for p in positions]
+        assert reader.get_postings("missing").length == 0
+        assert dict(reader.doc_lengths()) == doc_lengths
+    finally:
+        reader.close()
+
+
+@pytest.mark.parametrize("codec", [codec for codec in CODECS if codec != 'raw'])
+def test_intersect_blocks_matches_brute_force(tmp_path, codec):
+    rng = random.Random(1)
+    n_docs = 20000
+    dfs = {"rare": 30, "few": 300, "some": 2500, "many": 9000, "most": 15000}
+    terms = {term: random_postings(rng, n_docs, df) for term, df in dfs.items()}
+    write_index(tmp_path / "index", terms, {doc_id: 1 for doc_id in range(n_docs)}, codec)
+
+    reader = BinaryIndexReader(tmp_path / "index")
+    try:
+        engine = BooleanQueryEngine(reader)
+        for _ in range(50):
+            query = rng.sample(sorted(terms), rng.randint(1, len(terms)))
+            expected = sorted(set.intersection(*(set(terms[term][0]) for term in query)))
+            assert engine.intersect_blocks(query) == expected
+        assert engine.intersect_blocks(["rare", "missing"]) == []
+        assert engine.intersect_blocks([]) == []
+    finally:
+        reader.close()
+
+
+GROUPED = {
+    "Health": [
+        {"revision_id": 1, "title": "Braces { and } [ ] in text", "summary": "Quotes \" and \\ escapes, é中😀"},
+        {"revision_id": 2, "title": "Nested", "summary": "", "extra": {"list": [1, 2.5, None, True], "empty": {}}},
+    ],
+    "Empty": [],
+    "Sports": [{"revision_id": 3, "title": "A", "summary": " ".join(["word"] * 50)}],
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_grouped_json_parser_small_chunks(tmp_path, chunk_size, indent):
+    path = tmp_path / "documents.json"
+    path.write_text(json.dumps(GROUPED, indent=indent, ensure_ascii=False), encoding="utf-8")
+    expected = [(topic, doc) for topic, docs in GROUPED.items() for doc in docs]
+    assert list(iter_grouped_json(path, chunk_size)) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5])
+def test_grouped_json_parser_edge_cases(tmp_path, chunk_size):
+    path = tmp_path / "documents.json"
+    path.write_text(" { } ")
+    assert list(iter_grouped_json(path, chunk_size)) == []
+
+    path.write_text('{"Health": [{"revision_id": 1}, ')
+    with pytest.raises(ValueError):
+        list(iter_grouped_json(path, chunk_size))
@@ -1,90 +1,603 @@
-import json
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import joblib
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from preprocess_index import Preprocessor
-from summarizer_module import generate_summary_with_gemini
+from summarizer_module import generate_summary_with_gemini, stream_summary_with_gemini
+from document_stream import iter_documents
+from document_store import DocumentStore
+from dense_index import DenseIndex
+from passage_index import PassageIndex
+from query_cache import QueryCache
+from summary_cache import normalize_query, SUMMARY_CACHE_FILE
+
+# The fitted vectorizer, TF-IDF matrix and document table are saved next to the
+# other models, tagged with a fingerprint of the documents file they were built
+# from, so a restart loads them instead of refitting over the whole corpus. The
+# document summaries live in a file of their own (see document_store.py).
+ARTIFACT_FILE = 'model/qa_system.joblib'
+SUMMARIES_SUFFIX = '.summaries'
+VECTORS_SUFFIX = '.vectors'
+ARTIFACT_VERSION = 5
+
+# 'tfidf' scores every TF-IDF row; 'hybrid' scores only the rows that share a
+# feature with the query, found through a column-major copy of the matrix, so
+# it ranks exactly as 'tfidf' does at a cost that follows the number of
+# matches rather than the corpus size; 'dense'
+# searches LSA vectors through an approximate nearest-neighbour index (see
+# dense_index.py), which also finds documents that share no words with a
+# paraphrased query.
+RETRIEVAL_MODES = ('tfidf', 'hybrid', 'dense')
+
+# A topic-restricted search whose best score is below this also scores the
+# remaining topics, so a misclassified query still finds its documents.
+FALLBACK_THRESHOLD = 0.1
+
+
+def fingerprint_file(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RetrievalResult:
+    """
+    Everything one pass of the retrieval pipeline produced for a query.
+
+    Each stage fills in its fields exactly once and records how long it took
+    in ``timings`` (seconds, keyed by stage name), so summarisation and the
+    chat log reuse the results instead of running the search again.
+    """
+
+    def __init__(self, query, topics=None):
+        self.query = query
+        self.topics = topics
+        self.query_vector = None
+        self.doc_ids = []
+        self.scores = []
+        self.documents = []
+        self.answers = []
+        self.summary = None
+        # Set by retrieve(stream=True): yields the summary as it is generated.
+        self.summary_stream = None
+        self.cached = False
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+    def to_record(self):
+        """What ``query_cache`` keeps of the result: ranked doc ids and scores, answers and summary."""
+        return {
+            "doc_ids": [int(doc_id) for doc_id in self.doc_ids],
+            "scores": [float(score) for score in self.scores],
+            "answers": list(self.answers),
+            "summary": self.summary,
+        }
+
+    @classmethod
+    def from_record(cls, record, qa_system, query, topics=None):
+        """A result rebuilt from ``to_record`` output, with its documents fetched from ``qa_system``."""
+        result = cls(query, topics)
+        result.doc_ids = record["doc_ids"]
+        result.scores = record["scores"]
+        result.answers = record["answers"]
+        result.summary = record["summary"]
+        result.documents = qa_system.fetch_documents(result.doc_ids)
+        return result
+
+    def timings_ms(self):
+        timings = {name: round(seconds * 1000, 3) for name, seconds in self.timings.items()}
+        timings["total"] = round(self.total_time * 1000, 3)
+        return timings
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
 
 
 class QASystem:
-    def __init__(self, index_file, documents_file):
+    def __init__(self, documents_file, artifact_file=ARTIFACT_FILE, dense=False):
         # Load documents
-        with open(index_file, 'r') as file:
-            self.inverted_index = json.load(file)
-        with open(documents_file, 'r') as file:
-            raw_data = json.load(file)
-            # Flatten documents from all topics
-            self.documents = [
-                doc for topic_docs in raw_data.values() for doc in topic_docs
-            ]
+        self.documents_file = str(documents_file)
+        self.artifact_file = artifact_file
         self.preprocessor = Preprocessor()
-        self.vectorizer = TfidfVectorizer(stop_words='english')
-        self._prepare_tfidf()
+        self.source_stat = _file_stat(self.documents_file)
+        self.fingerprint = fingerprint_file(self.documents_file)
+        self.dense_index = None
+        self._tfidf_columns = None
+        if not self._load_artifact():
+            self._load_documents()
+            self.vectorizer = TfidfVectorizer(stop_words='english')
+            self._prepare_tfidf()
+            self._prepare_passages()
+            if dense:
+                self._prepare_dense()
+            self._save_artifact()
+        elif dense and self.dense_index is None:
+            self.enable_dense()
+
+    def _load_documents(self):
+        """
+        Stream documents from all topics, keeping only those with a summary.
+
+        Documents are laid out topic by topic, so each topic's TF-IDF rows form
+        one contiguous range of the matrix, recorded in ``self.partitions``.
+        """
+        self.partitions = {}
+        summaries_path = self.artifact_file + SUMMARIES_SUFFIX if self.artifact_file else None
+        self.documents = DocumentStore.build(self._partitioned_documents(), summaries_path)
+
+    def _partitioned_documents(self):
+        """
+        Yield the documents with a summary topic by topic, recording each topic's row range as it ends.
+
+        The grouped JSON layout already lists documents topic by topic, so they
+        go straight through; JSONL, whose topics may interleave, is read once
+        per topic.
+        """
+        if self.documents_file.endswith('.jsonl'):
+            documents = self._jsonl_by_topic()
+        else:
+            documents = ((topic, doc) for topic, doc in iter_documents(self.documents_file) if doc.get('summary', ''))
+
+        current, start, rows = None, 0, 0
+        for topic, doc in documents:
+            if rows == start or topic != current:
+                if rows > start:
+                    self.partitions[current] = (start, rows)
+                if topic in self.partitions:
+                    raise ValueError(f"Malformed document file {self.documents_file}: topic {topic!r} appears twice")
+                current, start = topic, rows
+            yield dict(doc, topic=topic)
+            rows += 1
+        if rows > start:
+            self.partitions[current] = (start, rows)
+
+    def _jsonl_by_topic(self):
+        """
+        Documents with a summary from a JSONL file, grouped by topic in order of first appearance.
+
+        The first pass yields the first topic's documents while noting the
+        others; each further topic takes one more streamed pass, so only the
+        list of topics is held in memory.
+        """
+        topics = {}
+        for topic, doc in iter_documents(self.documents_file):
+            if doc.get('summary', ''):
+                topics.setdefault(topic, len(topics))
+                if topics[topic] == 0:
+                    yield topic, doc
+        for topic in list(topics)[1:]:
+            for doc_topic, doc in iter_documents(self.documents_file):
+                if doc_topic == topic and doc.get('summary', ''):
+                    yield topic, doc
 
     def _prepare_tfidf(self):
         """Prepare TF-IDF vectors for all documents."""
-        # Use 'summary' field as the document content
-        self.document_texts = [doc.get('summary', '') for doc in self.documents]
-        # Filter out documents without a summary
-        self.documents = [doc for doc in self.documents if doc.get('summary', '')]
-        self.tfidf_matrix = self.vectorizer.fit_transform(self.document_texts)
-
-    def search_query(self, query):
-        """Search for query terms using TF-IDF similarity."""
-        query_vector = self.vectorizer.transform([query])
-        similarities = cosine_similarity(query_vector, self.tfidf_matrix).flatten()
-        # Retrieve document IDs of the top-matching documents with relevance scores
-        top_indices = similarities.argsort()[-10:][::-1]  # Top 10 results
+        # Use 'summary' field as the document content; rows line up with self.documents
+        self.tfidf_matrix = self.vectorizer.fit_transform(self.documents.summaries())
+
+    def _prepare_passages(self):
+        """Split summaries into passages and vectorise them for answer extraction."""
+        self.passage_index = PassageIndex.build(self.documents, self.vectorizer)
+
+    def _prepare_dense(self, **options):
+        """Build the LSA vectors and their ANN index; ``options`` go to ``DenseIndex.build``."""
+        vectors_path = self.artifact_file + VECTORS_SUFFIX if self.artifact_file else None
+        self.dense_index = DenseIndex.build(self.tfidf_matrix, vectors_path, **options)
+
+    def enable_dense(self, **options):
+        """Add dense retrieval to a system built without it, saving the index with the artifact."""
+        self._prepare_dense(**options)
+        self._save_artifact()
+
+    def _load_artifact(self):
+        """Load the saved TF-IDF state if it was built from the current documents file."""
+        if not self.artifact_file or not os.path.exists(self.artifact_file):
+            return False
+        try:
+            artifact = joblib.load(self.artifact_file)
+        except Exception:
+            return False
+        if artifact.get('version') != ARTIFACT_VERSION or artifact.get('fingerprint') != self.fingerprint:
+            return False
+        if not artifact['documents'].is_valid():
+            return False
+        self.documents = artifact['documents']
+        self.partitions = artifact['partitions']
+        self.vectorizer = artifact['vectorizer']
+        self.tfidf_matrix = artifact['tfidf_matrix']
+        self.passage_index = artifact['passage_index']
+        dense_index = artifact['dense_index']
+        self.dense_index = dense_index if dense_index is not None and dense_index.is_valid() else None
+        return True
+
+    def _save_artifact(self):
+        if not self.artifact_file:
+            return
+        artifact = {
+            "version": ARTIFACT_VERSION,
+            "fingerprint": self.fingerprint,
+            "documents": self.documents,
+            "partitions": self.partitions,
+            "vectorizer": self.vectorizer,
+            "tfidf_matrix": self.tfidf_matrix,
+            "passage_index": self.passage_index,
+            "dense_index": self.dense_index,
+        }
+        os.makedirs(os.path.dirname(self.artifact_file) or '.', exist_ok=True)
+        # Written under a temporary name and swapped in, so a concurrent reader never sees half a file.
+        joblib.dump(artifact, self.artifact_file + '.tmp')
+        os.replace(self.artifact_file + '.tmp', self.artifact_file)
+
+    def is_stale(self):
+        """
+        Whether the documents file changed since this system was built.
+
+        The file is only re-hashed when its size or modification time moved, and
+        a file that was touched without changing its contents is not stale.
+        """
+        stat = _file_stat(self.documents_file)
+        if stat == self.source_stat:
+            return False
+        if fingerprint_file(self.documents_file) != self.fingerprint:
+            return True
+        self.source_stat = stat
+        return False
+
+    def _partition_ranges(self, topics):
+        """Row ranges of the partitions for ``topics``, or of every partition if none of them is indexed."""
+        if isinstance(topics, str):
+            topics = [topics]
+        ranges = [self.partitions[topic] for topic in topics or () if topic in self.partitions]
+        return sorted(set(ranges)) or sorted(self.partitions.values())
+
+    def _score_partitions(self, query_vectors, ranges):
+        """
+        Similarity of each query against the given row ranges, with the matrix row of each column.
+
+        The TF-IDF rows and the query vectors are both L2-normalised, so the
+        cosine similarity is just the sparse dot product. It is computed as
+        rows times query columns: scipy's row-major kernel is several times
+        faster that way round than the product with the transposed slice.
+        """
+        if not ranges:
+            return np.empty(0, dtype=np.int64), np.zeros((query_vectors.shape[0], 0))
+        rows = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        query_columns = query_vectors.T.tocsr()
+        scores = np.hstack([
+            (self.tfidf_matrix[start:stop] @ query_columns).T.toarray() for start, stop in ranges
+        ])
+        return rows, scores
+
+    @staticmethod
+    def _top_k(scores, k):
+        """
+        Indices of the ``k`` highest scores, best first.
+
+        ``argpartition`` finds the k-th best score without sorting everything;
+        ties go to the later index, the order a reversed ``argsort`` gives.
+        """
+        n = len(scores)
+        if k <= 0 or not n:
+            return np.empty(0, dtype=np.int64)
+        if k < n:
+            kth = scores[np.argpartition(scores, n - k)[n - k]]
+            above = np.flatnonzero(scores > kth)
+            tied = np.flatnonzero(scores == kth)[::-1][:k - len(above)]
+            candidates = np.concatenate([above, tied])
+        else:
+            candidates = np.arange(n)
+        return candidates[np.lexsort((-candidates, -scores[candidates]))]
+
+    def _search_vectors(self, query_vectors, topics, fallback_threshold, k):
+        ranges = self._partition_ranges(topics)
+        rows, scores = self._score_partitions(query_vectors, ranges)
+
+        fallback = {}
+        if fallback_threshold is not None:
+            best = scores.max(axis=1) if scores.shape[1] else np.zeros(scores.shape[0])
+            weak = np.flatnonzero(best < fallback_threshold)
+            rest = sorted(set(self.partitions.values()) - set(ranges))
+            if len(weak) and rest:
+                rest_rows, rest_scores = self._score_partitions(query_vectors[weak], rest)
+                fallback = {q: (np.concatenate([rows, rest_rows]), np.concatenate([scores[q], rest_scores[i]]))
+                            for i, q in enumerate(weak)}
+
+        results = []
+        for q in range(query_vectors.shape[0]):
+            q_rows, q_scores = fallback.get(q, (rows, scores[q]))
+            results.append(self._ranked(q_rows, q_scores, k))
+        return results
+
+    def _ranked(self, rows, scores, k):
         return [
-            {"doc_id": self.documents[i]['revision_id'], "relevance": similarities[i]}
-            for i in top_indices if similarities[i] > 0
+            {"doc_id": self.documents.revision_id(rows[i]), "relevance": scores[i]}
+            for i in self._top_k(scores, k) if scores[i] > 0
         ]
 
+    def candidate_rows(self, query_vector):
+        """
+        Matrix rows, in order, of the documents sharing a vectorizer feature with ``query_vector``.
+
+        These are exactly the rows with a nonzero TF-IDF score: they are read
+        from the query's columns of a column-major copy of the matrix, made on
+        first use.
+        """
+        if self._tfidf_columns is None:
+            self._tfidf_columns = self.tfidf_matrix.tocsc()
+        if not query_vector.nnz:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(self._tfidf_columns[:, query_vector.indices].indices).astype(np.int64)
+
+    def _score_rows(self, query_vector, rows):
+        return (self.tfidf_matrix[rows] @ query_vector.T).toarray().ravel()
+
+    def _search_hybrid(self, query_vectors, topics, fallback_threshold, k):
+        ranges = self._partition_ranges(topics)
+        results = []
+        for q in range(query_vectors.shape[0]):
+            candidates = self.candidate_rows(query_vectors[q])
+            in_topic = np.zeros(len(candidates), dtype=bool)
+            for start, stop in ranges:
+                in_topic |= (candidates >= start) & (candidates < stop)
+            rows = candidates[in_topic]
+            scores = self._score_rows(query_vectors[q], rows)
+            if fallback_threshold is not None and (not len(scores) or scores.max() < fallback_threshold):
+                rest = candidates[~in_topic]
+                rows = np.concatenate([rows, rest])
+                scores = np.concatenate([scores, self._score_rows(query_vectors[q], rest)])
+            results.append(self._ranked(rows, scores, k))
+        return results
+
+    def _search_dense(self, query_vectors, topics, fallback_threshold, k, nprobe=None):
+        if self.dense_index is None:
+            raise ValueError("Dense retrieval needs a QASystem built with dense=True")
+        ranges = self._partition_ranges(topics)
+        if len(ranges) == len(self.partitions):
+            ranges = None
+
+        results = []
+        for q, (rows, scores) in enumerate(self.dense_index.search(query_vectors, k, nprobe, ranges)):
+            if ranges is not None and fallback_threshold is not None and (not len(scores) or scores[0] < fallback_threshold):
+                rows, scores = self.dense_index.search(query_vectors[q], k, nprobe)[0]
+            results.append([
+                {"doc_id": self.documents.revision_id(row), "relevance": float(score)}
+                for row, score in zip(rows, scores) if score > 0
+            ])
+        return results
+
+    def _search(self, query_vectors, topics, fallback_threshold, k, mode):
+        if mode == 'tfidf':
+            return self._search_vectors(query_vectors, topics, fallback_threshold, k)
+        if mode == 'hybrid':
+            return self._search_hybrid(query_vectors, topics, fallback_threshold, k)
+        if mode == 'dense':
+            return self._search_dense(query_vectors, topics, fallback_threshold, k)
+        raise ValueError(f"Unknown retrieval mode {mode!r}, expected one of {RETRIEVAL_MODES}")
+
+    def search_query(self, query, topics=None, fallback_threshold=None, k=10, mode='tfidf'):
+        """
+        Search for query terms using TF-IDF similarity, or LSA similarity with ``mode='dense'``.
+
+        ``mode='hybrid'`` gives the same results as ``'tfidf'``, scoring only
+        the documents that share at least one feature with the query.
+
+        Only the partitions of ``topics`` (one topic or several) are scored. With
+        a ``fallback_threshold``, the other partitions are scored as well when the
+        best score in the requested ones falls below it.
+        """
+        return self._search(self.vectorizer.transform([query]), topics, fallback_threshold, k, mode)[0]
+
+    def search_batch(self, queries, k=10, topics=None, fallback_threshold=None, batch_size=1024, mode='tfidf'):
+        """
+        ``search_query`` for many queries, scoring each batch in one sparse matrix product.
+
+        Returns one result list per query, in order.
+        """
+        queries = list(queries)
+        results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            results.extend(self._search(self.vectorizer.transform(batch), topics, fallback_threshold, k, mode))
+        return results
+
     def fetch_documents(self, doc_ids):
-        """Fetch full documents using their IDs."""
-        return [doc for doc in self.documents if doc['revision_id'] in doc_ids]
+        """Fetch full documents using their IDs, in the order of ``doc_ids``."""
+        return self.documents.fetch(doc_ids)
 
-    def extract_answers(self, query, documents, top_n=3):
-        """Extract or summarize answers from the top documents."""
-        ranked_docs = sorted(documents, key=lambda doc: query in doc['summary'], reverse=True)
-        return [doc['summary'] for doc in ranked_docs[:top_n]]
+    def extract_answers(self, query, documents, top_n=3, query_vector=None):
+        """Extract the passages of the top documents that best match the query."""
+        if query_vector is None:
+            query_vector = self.vectorizer.transform([query])
+        answers = []
+        for row, start, end, _ in self.passage_index.top_passages(query_vector, [doc.row for doc in documents], None):
+            passage = self.documents.summary(row)[start:end]
+            # Summaries repeat themselves often enough that the same passage can rank more than once.
+            if passage not in answers:
+                answers.append(passage)
+                if len(answers) == top_n:
+                    break
+        return answers
 
-    def fetch_relevant_documents(self, query):
+    def retrieve(self, query, topics=None, fallback_threshold=None, k=10, mode='tfidf'):
+        """Run the retrieval stages once for ``query`` and return them as a ``RetrievalResult``."""
+        result = RetrievalResult(query, topics)
+        with result.stage("vectorize"):
+            result.query_vector = self.vectorizer.transform([query])
+        with result.stage("score"):
+            doc_results = self._search(result.query_vector, topics, fallback_threshold, k, mode)[0]
+            result.doc_ids = [doc_result["doc_id"] for doc_result in doc_results]
+            result.scores = [doc_result["relevance"] for doc_result in doc_results]
+        with result.stage("fetch"):
+            result.documents = self.fetch_documents(result.doc_ids)
+        with result.stage("extract"):
+            result.answers = self.extract_answers(query, result.documents, query_vector=result.query_vector)
+        return result
+
+    def fetch_relevant_documents(self, query, topics=None, fallback_threshold=None, mode='tfidf'):
         """Fetch and summarize relevant documents for a query."""
-        doc_results = self.search_query(query)
-        doc_ids = [result["doc_id"] for result in doc_results]
-        relevance_scores = [result["relevance"] for result in doc_results]
-        documents = self.fetch_documents(doc_ids)
-        answers = self.extract_answers(query, documents)
-        return answers, relevance_scores
+        result = self.retrieve(query, topics, fallback_threshold, mode=mode)
+        return result.answers, result.scores
 
 
+_qa_system = None
+_qa_system_lock = threading.Lock()
 
-def fetch_relevant_documents(query, topic, inverted_index, scraped_data):
+
+def get_qa_system(documents_file='data/scraped_data.json', dense=False):
     """
-    Wrapper function for QASystem to fetch and summarize relevant documents.
+    The process-wide ``QASystem``, built on first use and reused afterwards.
+
+    It is rebuilt, refreshing the saved artifact, only when the documents file
+    has changed or a different documents file is asked for. Asking
+    for ``dense`` retrieval adds the dense index to the running system.
+    """
+    global _qa_system
+    with _qa_system_lock:
+        if (
+            _qa_system is None
+            or _qa_system.documents_file != str(documents_file)
+            or _qa_system.is_stale()
+        ):
+            _qa_system = QASystem(documents_file, dense=dense)
+        elif dense and _qa_system.dense_index is None:
+            _qa_system.enable_dense()
+        return _qa_system
+
+
+def summary_cache_key(query, result):
+    """Persistent summary cache key: the normalised query and ranked doc ids."""
+    return normalize_query(query), [int(doc_id) for doc_id in result.doc_ids]
+
+
+def summary_prompt(query, answers):
+    """Combine input for summary generation."""
+    combined_input = f"Query: {query}\n\nSummarize the following answers based on the query:\n"
+    for i, answer in enumerate(answers, 1):
+        combined_input += f"{i}. {answer}\n"
+    return combined_input
+
+
+# Shared by every caller of retrieve(), in this process and, through a table in
+# the summary cache file, with the other app (app.py or terminal_app.py).
+query_cache = QueryCache(path=SUMMARY_CACHE_FILE)
+
+# Runs retrieval warm-up alongside query classification.
+retrieval_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="retrieval")
+
+
+def warm_up(query=None, mode='hybrid'):
+    """
+    Load the QA system in the background, e.g. while the query is being classified.
+
+    With a ``query``, its candidate rows are looked up as well, so a hybrid
+    search finds the column-major matrix built. Returns the Future of the
+    QASystem; ``retrieve`` waits for a load in progress rather than starting
+    another.
+    """
+    def load():
+        qa_system = get_qa_system(dense=(mode == 'dense'))
+        if query is not None and mode == 'hybrid':
+            qa_system.candidate_rows(qa_system.vectorizer.transform([query]))
+        return qa_system
+
+    return retrieval_executor.submit(load)
+
+
+def _stream_summary(result, key, fingerprint):
+    """Yield the summary of ``result`` as it is generated, then store it and cache the result."""
+    chunks = []
+    with result.stage("summarize"):
+        prompt = summary_prompt(result.query, result.answers)
+        for chunk in stream_summary_with_gemini([prompt], summary_cache_key(result.query, result)):
+            chunks.append(chunk)
+            yield chunk
+    result.summary = "".join(chunks).strip()
+    result.summary_stream = None
+    if key is not None:
+        query_cache.put(key, result.to_record(), fingerprint)
+
+
+def retrieve(query, topic, mode='hybrid', use_cache=True, stream=False):
+    """
+    Retrieve, extract answers for and summarise a query in a single pass.
 
     Args:
         query (str): User query.
-        topic (str): Classified topic of the query.
-        inverted_index (dict): The inverted index.
-        scraped_data (dict): The scraped data.
+        topic (str or list of str): Classified topic of the query, or several
+            topics, ranked together in one pass and summarised once.
+        mode (str): 'hybrid' to score only documents sharing a term with
+            the query, 'tfidf' to score every document, 'dense' for LSA
+            vectors.
+        use_cache (bool): Answer from, and store into, ``query_cache``.
+        stream (bool): Return before summarising; the summary is generated
+            as ``summary_stream`` is iterated, and set once it is exhausted.
 
     Returns:
-        tuple: Final summary, answers, relevance scores, and document IDs.
+        RetrievalResult: Ranked document IDs and scores, documents, answers,
+        summary, and the time each stage took. Results served from the cache
+        have ``cached`` set and a single "cache" timing.
     """
-    qa_system = QASystem('data/inverted_index.json', 'data/scraped_data.json')
-    answers, relevance_scores = qa_system.fetch_relevant_documents(query)
-    doc_results = qa_system.search_query(query)
+    start = time.perf_counter()
+    qa_system = get_qa_system(dense=(mode == 'dense'))
 
-    # Combine input for summary generation
-    combined_input = f"Query: {query}\n\nSummarize the following answers based on the query:\n"
-    for i, answer in enumerate(answers, 1):
-        combined_input += f"{i}. {answer}\n"
+    # Queries that tokenise to nothing cannot be told apart, so they are never cached.
+    tokens = qa_system.preprocessor.tokenizer(query) if use_cache else []
+    key = query_cache.key(tokens, topic, mode)
+    if tokens:
+        cached = query_cache.get(key, qa_system.fingerprint)
+        if cached is not None:
+            result = RetrievalResult.from_record(cached, qa_system, query, topic)
+            result.cached = True
+            result.timings = {"cache": time.perf_counter() - start}
+            if stream:
+                result.summary_stream = iter([result.summary])
+            return result
 
-    summary = generate_summary_with_gemini([combined_input])
+    result = qa_system.retrieve(query, topic, FALLBACK_THRESHOLD, mode=mode)
+    if stream:
+        result.summary_stream = _stream_summary(result, key if tokens else None, qa_system.fingerprint)
+        return result
+    with result.stage("summarize"):
+        result.summary = generate_summary_with_gemini([summary_prompt(query, result.answers)], summary_cache_key(query, result))
+    if tokens:
+        query_cache.put(key, result.to_record(), qa_system.fingerprint)
+    return result
 
-    # Include document IDs for tracking purposes
-    doc_ids = [result["doc_id"] for result in doc_results]
 
-    return summary, answers, relevance_scores, doc_ids
+def fetch_relevant_documents(query, topic, inverted_index, scraped_data):
+    """
+    Wrapper function for QASystem to fetch and summarize relevant documents.
 
+    Args:
+        query (str): User query.
+        topic (str or list of str): Classified topic of the query, or several
+            topics to search together.
+        inverted_index: Unused; retrieval needs no inverted index.
+        scraped_data: Unused; the QASystem reads the documents file itself.
+
+    Returns:
+        tuple: Final summary, answers, relevance scores, and document IDs.
+    """
+    result = retrieve(query, topic)
+    return result.summary, result.answers, result.scores, result.doc_ids